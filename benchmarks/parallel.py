@@ -0,0 +1,86 @@
+"""
+Speedup of parallel engines for growing number of worker processes.
+For every size and number of workers prints best wall time and speedup relative to the serial version
+(and checks that results are identical to it). Hulls are computed with default tolerance (or in exact mode
+with --exact), segment intersections in exact mode.
+
+Usage: python -m benchmarks.parallel [--sizes 1000000 10000000] [--segment-sizes 10000 100000]
+                                     [--workers 1 2 4 8] [--repeat 3] [--engines hull bentley_ottmann] [--exact]
+"""
+import argparse
+import os
+import time
+from typing import Optional
+
+import numpy as np
+
+import src.generation as gen
+from src.geometry import graham_indices, parallel_hull_indices, bentley_ottmann, parallel_bentley_ottmann
+
+CORNER1, CORNER2 = np.array([-1000.0, -1000.0]), np.array([1000.0, 1000.0])
+
+
+def measure(function, repeat: int):
+    """ Returns best wall time of given number of runs and result of the last one. """
+    best, result = float('inf'), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def hull_speedup(sizes, workers, repeat: int, epsilon: Optional[float]):
+    print(f'{"hull":>10} {"points":>10} {"workers":>8} {"time [s]":>10} {"speedup":>8} {"identical":>10}')
+    for n in sizes:
+        np.random.seed(n)
+        points = gen.random_points_plane(n, CORNER1, CORNER2)
+        serial, expected = measure(lambda: graham_indices(points, epsilon), repeat)
+        print(f'{"serial":>10} {n:>10} {1:>8} {serial:>10.4f} {1.0:>8.2f} {"-":>10}')
+        for count in workers:
+            elapsed, result = measure(lambda: parallel_hull_indices(points, epsilon, workers=count, min_parallel=0),
+                                      repeat)
+            identical = np.array_equal(points[result], points[expected])
+            print(f'{"parallel":>10} {n:>10} {count:>8} {elapsed:>10.4f} {serial / elapsed:>8.2f} {identical!s:>10}')
+
+
+def short_segments(n: int) -> list:
+    """ Random segments with length chosen so that there are about as many intersections as segments. """
+    begin = np.random.uniform(CORNER1, CORNER2, (n, 2))
+    end = begin + np.random.uniform(-1, 1, (n, 2)) * (CORNER2 - CORNER1) / np.sqrt(n)
+    return np.stack((begin, end), axis=1).tolist()
+
+
+def bentley_ottmann_speedup(sizes, workers, repeat: int):
+    print(f'{"sweep":>10} {"segments":>10} {"workers":>8} {"time [s]":>10} {"speedup":>8} {"identical":>10}')
+    for n in sizes:
+        np.random.seed(n)
+        segments = short_segments(n)
+        serial, expected = measure(lambda: bentley_ottmann(segments), repeat)
+        print(f'{"serial":>10} {n:>10} {1:>8} {serial:>10.4f} {1.0:>8.2f} {"-":>10}')
+        for count in workers:
+            elapsed, result = measure(lambda: parallel_bentley_ottmann(segments, workers=count, min_parallel=0),
+                                      repeat)
+            print(f'{"parallel":>10} {n:>10} {count:>8} {elapsed:>10.4f} {serial / elapsed:>8.2f} '
+                  f'{result == expected!s:>10}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10 ** 6, 10 ** 7])
+    parser.add_argument('--segment-sizes', type=int, nargs='+', default=[10 ** 4, 10 ** 5])
+    parser.add_argument('--workers', type=int, nargs='+',
+                        default=[2 ** k for k in range(int(np.log2(os.cpu_count() or 1)) + 1)])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--engines', nargs='+', default=['hull', 'bentley_ottmann'])
+    parser.add_argument('--exact', action='store_true', help='compute hulls in exact mode')
+    args = parser.parse_args()
+
+    if 'hull' in args.engines:
+        hull_speedup(args.sizes, args.workers, args.repeat, None if args.exact else 1e-10)
+    if 'bentley_ottmann' in args.engines:
+        bentley_ottmann_speedup(args.segment_sizes, args.workers, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
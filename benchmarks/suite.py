@@ -0,0 +1,332 @@
+"""
+Benchmark suite running geometry engines on datasets from src.generation.
+
+For every engine, dataset and size it records best wall time, peak memory allocated by Python (measured
+with tracemalloc, in a separate run) and operation counts reported by the engine. Results are saved to JSON
+and compared with a stored baseline, the run fails (exit code 1) if any case got slower, uses more memory
+or does more operations than the baseline by more than the threshold. All engines run on the same dataset
+get the same points, and the run also fails if they disagree on results that have to be equal (size of hull),
+so wrong results can not be stored as the baseline.
+Timed runs are done with instrumentation off. Counts that only instrumentation collects (like events of the
+sweep) are taken from a separate run with instrumentation on. With --instrument every case is also timed with
+instrumentation on, in runs interleaved with the ones with it off, and the relative overhead is reported
+together with collected counters and timers of phases.
+Instrumentation that is off has to cost nothing, so every run also times scalar orient predicates (the hottest
+counted calls) with it off against their plain formulas without any instrumentation, in interleaved runs, and
+fails if they are slower by more than the disabled threshold.
+
+Usage: python -m benchmarks.suite [--sizes 100 1000 10000 100000 1000000] [--engines graham jarvis ...]
+                                  [--repeat 3] [--output results.json] [--baseline benchmarks/baseline.json]
+                                  [--threshold 0.25] [--disabled-threshold 0.05] [--save-baseline] [--no-limits]
+                                  [--instrument]
+"""
+import argparse
+import json
+import sys
+import time
+import tracemalloc
+import zlib
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple, Any
+
+import numpy as np
+
+import src.generation as gen
+from src.instrumentation import Stats, instrument
+from src.geometry import utils
+from src.geometry import graham, jarvis, chan, triangulate_monotonic, triangulate_monotonic_linear, monotone_triangles, \
+    PointLocation
+from src.geometry.segments_intersections import bentley_ottmann
+
+BASELINE = 'benchmarks/baseline.json'
+CORNER1, CORNER2 = np.array([-1000.0, -1000.0]), np.array([1000.0, 1000.0])
+
+def _convex_polygon(points):
+    return points[np.argsort(np.arctan2(points[:, 1], points[:, 0]))]
+
+
+DATASETS: Dict[str, Callable[[int], np.ndarray]] = {
+    'plane': lambda n: gen.random_points_plane(n, CORNER1, CORNER2),
+    'circle': lambda n: gen.random_points_circle(n, 1000.0, np.array([0.0, 0.0])),
+    'segment': lambda n: gen.random_points_segment(n, CORNER1, CORNER2),
+    'weird': lambda n: gen.random_points_weird((n - 4) // 4, (n - 4) // 4, CORNER1, np.array([1000.0, -1000.0]),
+                                               CORNER2, np.array([-1000.0, 1000.0])),
+    'segments': lambda n: gen.random_segments_plane(n, CORNER1, CORNER2),
+    'monotone': lambda n: [tuple(p) for p in gen.random_monotone_polygon(n, CORNER1, CORNER2)],
+    # polygon and the same number of query points
+    'queries': lambda n: (gen.random_monotone_polygon(n, CORNER1, CORNER2),
+                          gen.random_points_plane(n, CORNER1, CORNER2)),
+    # convex polygon (triangulated as a fan around its first vertex, worst case of grid) and query points
+    'fan': lambda n: (_convex_polygon(gen.random_points_circle(n, 1000.0, np.array([0.0, 0.0]))),
+                      gen.random_points_plane(n, CORNER1, CORNER2)),
+}
+
+
+def _hull(algorithm):
+    return lambda points: {'hull': len(algorithm(points))}
+
+
+def _sweep(segments):
+    return {'intersections': bentley_ottmann(segments, output='count')}
+
+
+def _triangulation(algorithm):
+    return lambda poly: {'diagonals': len(algorithm(poly))}
+
+
+def _fan_triangles(poly):
+    n = len(poly)
+    return np.stack((np.zeros(max(n - 2, 0), dtype=int), np.arange(1, n - 1), np.arange(2, n)), axis=1)
+
+
+def _location(triangulate):
+    def run(data):
+        poly, queries = data
+        located = PointLocation(poly, triangulate(poly)).locate(queries)
+        return {'located': int(np.count_nonzero(located >= 0))}
+    return run
+
+
+@dataclass
+class Case:
+    """
+    Engine run on a dataset, sizes above limit are skipped unless limits are disabled. Given counters of
+    instrumentation are reported together with counts returned by the engine.
+    """
+    engine: str
+    dataset: str
+    run: Callable[[Any], Dict[str, int]]
+    limit: int = 10 ** 6
+    counters: Tuple[str, ...] = ()
+
+    def key(self, n: int) -> str:
+        return f'{self.engine}/{self.dataset}/{n}'
+
+
+# counts that have to be the same for all engines run on the same dataset
+CONSISTENT_COUNTS = ('hull', )
+
+CASES = [
+    *[Case('graham', dataset, _hull(graham)) for dataset in ('plane', 'circle', 'segment', 'weird')],
+    Case('jarvis', 'plane', _hull(jarvis)),
+    Case('jarvis', 'circle', _hull(jarvis), limit=10 ** 4),
+    Case('jarvis', 'segment', _hull(jarvis)),
+    Case('jarvis', 'weird', _hull(jarvis)),
+    # circle is the case of large hull (every point is its vertex), worst one for Chan's guess of hull size
+    *[Case('chan', dataset, _hull(chan)) for dataset in ('plane', 'circle', 'segment', 'weird')],
+    # long random segments have about n^2 / 10 intersections
+    Case('bentley_ottmann', 'segments', _sweep, limit=10 ** 3, counters=('events', )),
+    Case('triangulate_monotonic', 'monotone', _triangulation(triangulate_monotonic), limit=10 ** 4),
+    Case('triangulate_monotonic_linear', 'monotone', _triangulation(triangulate_monotonic_linear)),
+    Case('point_location', 'queries', _location(monotone_triangles)),
+    Case('point_location', 'fan', _location(_fan_triangles), limit=10 ** 5),
+]
+
+
+def _orient(a, b, c):
+    return a[0]*b[1] + b[0]*c[1] + c[0]*a[1] - a[0]*c[1] - b[0]*a[1] - c[0]*b[1]
+
+
+def _orient_translated(a, b, c):
+    ax, ay, bx, by, cx, cy = float(a[0]), float(a[1]), float(b[0]), float(b[1]), float(c[0]), float(c[1])
+    return (ax - cx) * (by - cy) - (ay - cy) * (bx - cx)
+
+
+def _orient_robust(a, b, c):
+    ax, ay, bx, by, cx, cy = float(a[0]), float(a[1]), float(b[0]), float(b[1]), float(c[0]), float(c[1])
+    left = (ax - cx) * (by - cy)
+    right = (ay - cy) * (bx - cx)
+    det = left - right
+    if abs(det) > utils.ORIENT_ERROR_BOUND * (abs(left) + abs(right)) or (left == 0 and right == 0):
+        return det
+    return float(utils.orient_exact((ax, ay), (bx, by), (cx, cy)))
+
+
+# the same formulas as scalar orient predicates in src.geometry.utils, without any instrumentation
+REFERENCE_PREDICATES = {'orient': _orient, 'orient_translated': _orient_translated, 'orient_robust': _orient_robust}
+
+
+def generate(case: Case, n: int):
+    """
+    Generates dataset for given case, seeded by its name and size, so that every run uses the same data
+    and all engines run on the same dataset get the same points.
+    """
+    np.random.seed(zlib.crc32(f'{case.dataset}/{n}'.encode()))
+    return DATASETS[case.dataset](n)
+
+
+def _timed(case: Case, data, instrumented: bool) -> Tuple[float, Dict[str, int], Optional[Stats]]:
+    """ Runs case once, returns wall time, operation counts and statistics (if instrumentation was on). """
+    if not instrumented:
+        start = time.perf_counter()
+        counts = case.run(data)
+        return time.perf_counter() - start, counts, None
+    with instrument() as stats:
+        start = time.perf_counter()
+        counts = case.run(data)
+        elapsed = time.perf_counter() - start
+    return elapsed, counts, stats
+
+
+def measure(case: Case, n: int, repeat: int, memory: bool, instrumented: bool = False) -> Dict[str, Any]:
+    """
+    Returns best wall time of given number of runs, peak memory, operation counts (and instrumentation,
+    with best wall time of runs with instrumentation on).
+    """
+    data = generate(case, n)
+    best = {False: float('inf'), True: float('inf')}
+    stats = None
+    # runs with instrumentation on and off are interleaved, so that both are timed under the same conditions
+    for _ in range(repeat):
+        for on in ((False, True) if instrumented else (False, )):
+            elapsed, counts, collected = _timed(case, data, on)
+            best[on] = min(best[on], elapsed)
+            stats = collected or stats
+
+    if case.counters:
+        if stats is None:
+            _, _, stats = _timed(case, data, True)
+        counts.update((name, stats.counters.get(name, 0)) for name in case.counters)
+    result = {'n': n, 'time': best[False], 'counts': counts}
+    if memory:
+        tracemalloc.start()
+        case.run(data)
+        result['memory'] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    if instrumented:
+        result['instrumentation'] = stats.as_dict()
+        result['instrumented time'] = best[True]
+    return result
+
+
+def disabled_cost(n: int, repeat: int, chunk: int = 1000) -> Dict[str, float]:
+    """
+    Returns relative overhead of scalar orient predicates (as callers get them while instrumentation is off)
+    over their reference formulas, called on n triples of points. Both are timed on the same chunks of triples
+    in interleaved runs (best of given number for every chunk), so that they are timed under the same conditions.
+    """
+    np.random.seed(zlib.crc32(f'disabled/{n}'.encode()))
+    points = DATASETS['plane'](n + 2).tolist()
+    triples = list(zip(points, points[1:], points[2:]))
+    costs = {}
+    for name, reference in REFERENCE_PREDICATES.items():
+        predicates = (getattr(utils, name), reference)
+        total = [0.0, 0.0]
+        for begin in range(0, n, chunk):
+            part = triples[begin:begin + chunk]
+            best = [float('inf'), float('inf')]
+            for _ in range(repeat):
+                for i, predicate in enumerate(predicates):
+                    start = time.perf_counter()
+                    for a, b, c in part:
+                        predicate(a, b, c)
+                    best[i] = min(best[i], time.perf_counter() - start)
+            total = [t + b for t, b in zip(total, best)]
+        costs[name] = total[0] / total[1] - 1
+    return costs
+
+
+def check_consistency(results: Dict[str, Dict]) -> List[str]:
+    """ Returns descriptions of cases in which engines computing the same thing (like hull) disagree. """
+    values: Dict[Tuple[str, str, str], Dict[str, int]] = {}
+    for key, result in results.items():
+        engine, dataset, n = key.split('/')
+        for name in CONSISTENT_COUNTS:
+            if name in result['counts']:
+                values.setdefault((dataset, n, name), {})[engine] = result['counts'][name]
+    return [f'{dataset}/{n}: {name} differs between engines {engines}'
+            for (dataset, n, name), engines in values.items() if len(set(engines.values())) > 1]
+
+
+def compare(results: Dict[str, Dict], baseline: Dict[str, Dict], threshold: float,
+            min_time: float) -> List[str]:
+    """ Returns descriptions of regressions against baseline (cases missing in either are ignored). """
+    regressions = []
+    for key, current in results.items():
+        if key not in baseline:
+            continue
+        previous = baseline[key]
+        if current['time'] > max(previous['time'], min_time) * (1 + threshold):
+            regressions.append(f'{key}: time {previous["time"]:.6f}s -> {current["time"]:.6f}s')
+        if 'memory' in current and 'memory' in previous and current['memory'] > previous['memory'] * (1 + threshold):
+            regressions.append(f'{key}: memory {previous["memory"]} B -> {current["memory"]} B')
+        for name, count in current['counts'].items():
+            if count > previous['counts'].get(name, count) * (1 + threshold):
+                regressions.append(f'{key}: {name} {previous["counts"][name]} -> {count}')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10 ** k for k in range(2, 7)])
+    parser.add_argument('--engines', nargs='+', default=None, help='run only given engines')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', default=None, help='file to save results to')
+    parser.add_argument('--baseline', default=BASELINE)
+    parser.add_argument('--threshold', type=float, default=0.25, help='allowed relative slowdown')
+    parser.add_argument('--disabled-threshold', type=float, default=0.05,
+                        help='allowed relative overhead of orient predicates with instrumentation off')
+    parser.add_argument('--min-time', type=float, default=0.01, help='shorter times are compared as this one')
+    parser.add_argument('--save-baseline', action='store_true', help='store results as the new baseline')
+    parser.add_argument('--no-memory', action='store_true', help='skip measuring peak memory')
+    parser.add_argument('--no-limits', action='store_true', help='run every engine on every size')
+    parser.add_argument('--instrument', action='store_true', help='collect counters and timers of phases')
+    args = parser.parse_args()
+
+    results = {}
+    print(f'{"case":>50} {"time [s]":>12} {"memory [MB]":>12}  counts')
+    for case in CASES:
+        if args.engines is not None and case.engine not in args.engines:
+            continue
+        for n in args.sizes:
+            if n > case.limit and not args.no_limits:
+                continue
+            result = results[case.key(n)] = measure(case, n, args.repeat, not args.no_memory, args.instrument)
+            memory = f'{result["memory"] / 2 ** 20:12.3f}' if 'memory' in result else f'{"-":>12}'
+            print(f'{case.key(n):>50} {result["time"]:12.6f} {memory}  {result["counts"]}', flush=True)
+            if 'instrumentation' in result:
+                overhead = result['instrumented time'] / max(result['time'], 1e-9) - 1
+                print(f'{"instrumented":>50} {result["instrumented time"]:12.6f} {"":>12}  overhead {overhead:+.1%}')
+                print(f'{"":>50} {json.dumps(result["instrumentation"], sort_keys=True)}', flush=True)
+
+    if args.output is not None:
+        with open(args.output, 'w') as file:
+            json.dump(results, file, indent=2, sort_keys=True)
+
+    # instrumentation that is off must not slow down its hottest path
+    overheads = []
+    for name, cost in disabled_cost(10 ** 5, max(args.repeat, 5)).items():
+        print(f'{"disabled instrumentation " + name:>50} {"":>12} {"":>12}  overhead {cost:+.1%}')
+        if cost > args.disabled_threshold:
+            overheads.append(f'{name}: {cost:+.1%} over the same formula without instrumentation')
+
+    # wrong results must never become the baseline
+    inconsistencies = check_consistency(results)
+    for inconsistency in inconsistencies:
+        print('INCONSISTENT', inconsistency)
+    for overhead in overheads:
+        print('OVERHEAD', overhead)
+    if inconsistencies or overheads:
+        sys.exit(1)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as file:
+            json.dump(results, file, indent=2, sort_keys=True)
+        return
+
+    try:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+    except FileNotFoundError:
+        print(f'no baseline in {args.baseline}, nothing to compare')
+        return
+
+    regressions = compare(results, baseline, args.threshold, args.min_time)
+    for regression in regressions:
+        print('REGRESSION', regression)
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
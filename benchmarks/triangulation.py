@@ -0,0 +1,61 @@
+"""
+Compares triangulate_monotonic with triangulate_monotonic_linear on y-monotone polygons.
+Polygons from lab04 are used as they are, bigger ones are random y-monotone polygons of the same kind.
+
+Usage: python -m benchmarks.triangulation [--sizes 10 100 1000 10000 100000] [--repeat 3] [--limit 20000]
+"""
+import argparse
+import time
+
+import numpy as np
+
+import src.generation as gen
+from src.geometry import triangulate_monotonic
+from src.geometry.triangulation import triangulate_monotonic_linear
+
+LAB04_POLYGONS = [
+    [(0.0021586030529391342, 0.043873052784040883), (-0.014474461463189897, 0.035447807686001656),
+     (0.001715054665842361, 0.03342574886247225), (-0.014474461463189897, 0.0014098174899232208),
+     (0.0006061836981004209, -0.030943123686547384), (-0.010482525979318931, -0.03835733937282189),
+     (0.002380377246487528, -0.039705378588508165), (0.010807796601326233, 0.010846091999727137)],
+    [(0.49202998991935487, 0.07137618719362737), (0.591828377016129, 0.3746850107230392),
+     (0.8180380544354838, 0.5162291283700979), (0.591828377016129, 0.6577732460171568),
+     (0.4853767641129032, 0.9476016773897058), (0.3744896673387097, 0.6678835401348038),
+     (0.18376386088709679, 0.5398198146446078), (0.3789251512096774, 0.3881654028799019)],
+]
+
+
+def measure(function, poly, repeat: int) -> float:
+    """ Returns best wall time of given number of runs. """
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(poly)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 100, 1000, 10000, 100000])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--limit', type=int, default=20000, help='largest polygon given to triangulate_monotonic')
+    args = parser.parse_args()
+
+    np.random.seed(0)
+    polygons = [('lab04', poly) for poly in LAB04_POLYGONS]
+    polygons += [(str(n), [tuple(p) for p in gen.random_monotone_polygon(n, np.array([0, 0]), np.array([1, 1]))])
+                 for n in args.sizes]
+
+    print(f'{"polygon":>10} {"vertices":>10} {"triangulate_monotonic":>22} {"linear":>10} {"speedup":>8}')
+    for name, poly in polygons:
+        linear = measure(triangulate_monotonic_linear, poly, args.repeat)
+        if len(poly) <= args.limit:
+            current = measure(triangulate_monotonic, poly, args.repeat)
+            print(f'{name:>10} {len(poly):>10} {current:>22.6f} {linear:>10.6f} {current / linear:>8.1f}')
+        else:
+            print(f'{name:>10} {len(poly):>10} {"skipped":>22} {linear:>10.6f} {"-":>8}')
+
+
+if __name__ == '__main__':
+    main()
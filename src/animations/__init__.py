@@ -1,3 +1,5 @@
 from .convex_hull import ConvexHullAnimation, graham_generator, jarvis_generator
 from .segments_intersections import IntersectionsAnimation, bentley_ottmann_generator
 from .triangulation import TriangulationAnimation, triangulate_monotonic_generator
+from .frames import FrameState, decimate, merge_frames, sample_frames
+from .export import export_animation, ExportReport
@@ -1,19 +1,25 @@
-import copy
-from functools import cmp_to_key, partial
+from typing import Optional
 
 import numpy as np
 import matplotlib.pyplot as plt
 from matplotlib.animation import FuncAnimation
 
-from src.geometry import orient, dist2
+from src.geometry import orient, jarvis_indices
+from src.geometry.convex_hull import polar_order
+from src.animations.frames import FrameState, decimate
 
 
 class ConvexHullAnimation:
-    """ Creates step-by-step animation of convex hull creation. """
+    """
+    Creates step-by-step animation of convex hull creation.
+    Frames are delta frames (see src.animations.frames) with layers: 'hull' (stack of points),
+    'active' (currently considered point or None) and 'closed' (True when the hull is done).
+    """
 
     def __init__(self, points, frames):
         self.points = points
         self.frames = frames
+        self.state = FrameState()
 
         # init plot
         self.fig, self.ax = plt.subplots()
@@ -24,114 +30,84 @@ class ConvexHullAnimation:
         self.scatter_active = self.ax.scatter([], [], color='g')
         self.line_hull = self.ax.plot([], [], color='r')[0]
 
-        # init animation
-        self.animation = FuncAnimation(self.fig, self.animation_step, self.frames, self.animation_init, blit=True)
+        # init animation, frames may be a generator of unknown length, so they are not cached
+        self.animation = FuncAnimation(self.fig, self.animation_step, self.frames, self.animation_init, blit=True,
+                                       cache_frame_data=False)
 
     def animation_init(self):
+        self.state.reset()
         self.scatter_hull.set_offsets(np.empty((0, 2)))
         self.scatter_active.set_offsets(np.empty((0, 2)))
         self.line_hull.set_data([], [])
         return self.scatter_hull, self.scatter_active, self.line_hull
 
     def animation_step(self, frame):
-        hull, point = frame
+        self.state.apply(frame)
+        hull = self.state['hull'].items()
+        active = self.state['active'].value
 
-        if point is None:
+        if active is None:
             self.scatter_active.set_offsets(np.empty((0, 2)))
         else:
-            self.scatter_active.set_offsets([point])
-
-        if hull is None:
-            return self.scatter_active,
+            self.scatter_active.set_offsets([active])
 
         self.scatter_hull.set_offsets(hull)
-        self.line_hull.set_data(*zip(*hull))
+        if self.state['closed'].value and len(hull):
+            self.line_hull.set_data(np.append(hull[:, 0], hull[0, 0]), np.append(hull[:, 1], hull[0, 1]))
+        else:
+            self.line_hull.set_data(hull[:, 0], hull[:, 1])
 
         return self.scatter_hull, self.scatter_active, self.line_hull
 
 
-def graham_generator(points: np.ndarray, epsilon: float = 1e-10):
+def graham_generator(points: np.ndarray, epsilon: float = 1e-10, max_frames: Optional[int] = None, every: int = 1):
     """
-    Graham algorithm in form of a generator that yields next steps for animation.
+    Graham algorithm in form of a generator that yields next steps for animation (as delta frames).
+    Long runs can be sampled down to max_frames frames or every given number of frames can be merged.
     """
+    return decimate(_graham_frames(np.asarray(points), epsilon), max_frames, every)
 
-    # find first point (with lowest y then x) and remove it from points
-    i0 = min(enumerate(points), key=lambda x: (x[1][1], x[1][0]))[0]
-    p0 = points[i0]
-    points = points[np.arange(points.shape[0]) != i0]
 
-    # sort points by orient relative to p0
-    points = sorted(points, key=cmp_to_key(partial(orient, p0)), reverse=True)
+def _graham_frames(points: np.ndarray, epsilon: float):
 
-    # remove points that are co-linear
-    i = 0
-    while i < len(points)-1:
-        # if they are not co-linear continue
-        if abs(orient(p0, points[i], points[i+1])) > epsilon:
-            i += 1
-        # if they are co-linear and i is closer then i+1
-        elif dist2(p0, points[i]) < dist2(p0, points[i+1]):
-            del points[i]
-        # if they are co-linear and i+1 is closer than i
-        else:
-            del points[i+1]
+    # find first point and sort remaining ones by polar angle (without co-linear points)
+    i0, order = polar_order(points, epsilon)
+    p0 = points[i0]
+    points = list(points[order])
 
-    # initialize stack
+    # initialize stack (every frame shows considered point and hull before the decision about it is made)
     hull = [p0]
+    decision = [('push', 'hull', p0)]
 
     # main loop
     i = 0
     while i < len(points):
-        yield copy.copy(hull), points[i]
+        yield decision + [('set', 'active', points[i])]
 
         # if its on the right
         if len(hull) < 2 or orient(hull[-2], hull[-1], points[i]) > epsilon:
             hull.append(points[i])
+            decision = [('push', 'hull', points[i])]
             i += 1
         # if its on the left
         else:
             hull.pop()
+            decision = [('pop', 'hull')]
 
-    yield hull + hull[:1], None
-    return hull
+    yield decision + [('set', 'active', None), ('set', 'closed', True)]
 
 
-def jarvis_generator(points: np.ndarray, epsilon: float = 1e-10):
+def jarvis_generator(points: np.ndarray, epsilon: float = 1e-10, max_frames: Optional[int] = None, every: int = 1):
     """
-    JArvis algorithm in form of a generator that yields next steps for animation.
+    Jarvis algorithm in form of a generator that yields next steps for animation (as delta frames),
+    one for every step of gift wrapping.
+    Long runs can be sampled down to max_frames frames or every given number of frames can be merged.
     """
+    return decimate(_jarvis_frames(np.asarray(points), epsilon), max_frames, every)
 
-    # find first point (with lowest y then x)
-    p0 = points[min(enumerate(points), key=lambda x: (x[1][1], x[1][0]))[0]]
 
-    # init hull
-    hull = [p0]
+def _jarvis_frames(points: np.ndarray, epsilon: float):
+    for p in points[jarvis_indices(points, epsilon)]:
+        yield [('set', 'active', p), ('push', 'hull', p)]
 
-    # main loop
-    for i in range(len(points)):
-        yield copy.copy(hull), None
-
-        # find right most point relative to last in hull
-        best = None
-        for p in points:
-            yield None, p
-
-            # if there is no best
-            if best is None:
-                best = p
-            # if p is more to the right than best
-            elif orient(hull[-1], best, p) < -epsilon:
-                best = p
-            # if p and best are co-linear and best is closer than p
-            elif -epsilon < orient(hull[-1], best, p) < epsilon and dist2(hull[-1], best) < dist2(hull[-1], p):
-                best = p
-
-        # stop main loop if hull is closed
-        if np.all(best == hull[0]):
-            break
-
-        # add found point to hull
-        hull.append(best)
-
-    yield hull + hull[:1], None
-    return hull
+    yield [('set', 'active', None), ('set', 'closed', True)]
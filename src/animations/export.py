@@ -0,0 +1,174 @@
+"""
+Headless export of animations to video (or image sequence), without inlining frames into a notebook.
+
+Stream of delta frames is split into chunks, every chunk starts with a snapshot of the state before it,
+so chunks can be rendered independently (with Agg backend) in a pool of processes. Only a bounded number
+of chunks is in flight at once, so memory usage does not depend on the length of animation.
+Rendered frames are stitched into a video with ffmpeg (if it is available).
+"""
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import warnings
+from concurrent.futures import Future, ProcessPoolExecutor, FIRST_COMPLETED, wait
+from dataclasses import dataclass
+from typing import Callable, Iterable, List, Optional, Sequence, Any
+
+from src.animations.frames import Frame, FrameState
+
+VIDEO_FORMATS = ('.mp4', '.mkv', '.mov', '.webm', '.gif')
+FRAME_PATTERN = 'frame_%06d.png'
+
+# animation rendered by the current worker process
+_animation = None
+
+
+@dataclass
+class ExportReport:
+    """ Summary of export: output path, number of frames and render times (in seconds). """
+    path: str
+    frames: int
+    video: bool
+    wall_time: float
+    render_time: float
+    max_frame_time: float
+
+    @property
+    def mean_frame_time(self) -> float:
+        return self.render_time / self.frames if self.frames else 0.0
+
+
+def print_progress(done: int, timings: List[float]):
+    """ Default progress callback, prints number of rendered frames and render time of last chunk. """
+    mean = sum(timings) / len(timings) if timings else 0.0
+    print(f'{done} frames rendered, {mean * 1000:.1f} ms per frame (max {max(timings, default=0) * 1000:.1f} ms)',
+          file=sys.stderr, flush=True)
+
+
+def _init_worker(factory: Callable, args: Sequence[Any]):
+    """ Creates animation (without frames) once for every worker process. """
+    global _animation
+    import matplotlib.pyplot as plt
+    plt.switch_backend('Agg')
+    _animation = factory(*args, [])
+
+
+def _render_chunk(start: int, snapshot: Frame, frames: List[Frame], directory: str, dpi: float,
+                  animation=None) -> List[float]:
+    """ Renders frames (starting from state given by snapshot) to files, returns render time of every frame. """
+    animation = animation if animation is not None else _animation
+    animation.animation_init()
+    animation.state.apply(snapshot)
+
+    timings = []
+    for i, frame in enumerate(frames):
+        begin = time.perf_counter()
+        animation.animation_step(frame)
+        animation.fig.savefig(os.path.join(directory, FRAME_PATTERN % (start + i)), dpi=dpi)
+        timings.append(time.perf_counter() - begin)
+    return timings
+
+
+def _stitch(directory: str, path: str, fps: float):
+    """ Joins rendered frames into a video with ffmpeg. """
+    command = [shutil.which('ffmpeg'), '-y', '-loglevel', 'error', '-framerate', str(fps),
+               '-i', os.path.join(directory, FRAME_PATTERN)]
+    if not path.endswith('.gif'):
+        # most codecs require even dimensions
+        command += ['-pix_fmt', 'yuv420p', '-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2']
+    subprocess.run(command + [path], check=True)
+
+
+def export_animation(factory: Callable, args: Sequence[Any], frames: Iterable[Frame], path: str,
+                     fps: float = 25, dpi: float = 100, chunk_size: int = 50, workers: Optional[int] = None,
+                     progress: Optional[Callable[[int, List[float]], None]] = print_progress) -> ExportReport:
+    """
+    Renders animation to a video file (if path ends with one of VIDEO_FORMATS) or to a directory of PNG files.
+
+    :param factory: animation class (or function creating it), called as factory(*args, frames)
+    :param args: arguments of factory, for example (points, ) for ConvexHullAnimation
+    :param frames: delta frames, for example from graham_generator
+    :param path: output video file or directory for image sequence
+    :param fps: frames per second of video
+    :param dpi: resolution of rendered frames
+    :param chunk_size: number of frames rendered at once by a single worker
+    :param workers: number of worker processes, 0 renders in the current process, None uses all processors
+    :param progress: called after every chunk with number of rendered frames and render times of chunk frames
+    :return: summary of export
+    """
+    begin = time.perf_counter()
+    workers = os.cpu_count() if workers is None else workers
+
+    # video is stitched from frames rendered into temporary directory
+    video = path.lower().endswith(VIDEO_FORMATS)
+    if video and shutil.which('ffmpeg') is None:
+        warnings.warn('ffmpeg not found, exporting image sequence instead of video')
+        path, video = os.path.splitext(path)[0], False
+    temporary = tempfile.TemporaryDirectory() if video else None
+    directory = temporary.name if video else path
+    os.makedirs(directory, exist_ok=True)
+
+    # in the current process animation is rendered directly, otherwise every worker creates its own
+    local, pool = None, None
+    if workers == 0:
+        local = factory(*args, [])
+
+        def submit(*task):
+            future = Future()
+            future.set_result(_render_chunk(*task, animation=local))
+            return future
+    else:
+        pool = ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(factory, args))
+
+        def submit(*task):
+            return pool.submit(_render_chunk, *task)
+
+    count = done = 0
+    render_time = max_frame_time = 0.0
+    pending = set()
+
+    def collect(futures):
+        nonlocal done, render_time, max_frame_time
+        for future in futures:
+            timings = future.result()
+            done += len(timings)
+            render_time += sum(timings)
+            max_frame_time = max(max_frame_time, max(timings, default=0.0))
+            if progress is not None:
+                progress(done, timings)
+
+    try:
+        # state before every chunk is sent with it, at most two chunks per worker are in flight
+        state = FrameState()
+        chunk, snapshot = [], state.snapshot()
+        for frame in frames:
+            chunk.append(frame)
+            state.apply(frame)
+            if len(chunk) == chunk_size:
+                pending.add(submit(count, snapshot, chunk, directory, dpi))
+                count += len(chunk)
+                chunk, snapshot = [], state.snapshot()
+                if len(pending) >= 2 * max(workers, 1):
+                    finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    collect(finished)
+        if chunk:
+            pending.add(submit(count, snapshot, chunk, directory, dpi))
+            count += len(chunk)
+        collect(wait(pending).done)
+
+        if video:
+            _stitch(directory, path, fps)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+        if local is not None:
+            import matplotlib.pyplot as plt
+            plt.close(local.fig)
+        if temporary is not None:
+            temporary.cleanup()
+
+    return ExportReport(path, count, video, time.perf_counter() - begin, render_time, max_frame_time)
+
@@ -0,0 +1,204 @@
+"""
+Delta frames for animations. Generators yield frames as lists of operations and animations apply them
+incrementally to their FrameState, so that no frame holds a copy of the whole state.
+
+Operations (tuples):
+    ('push', layer, item) - appends item to the layer
+    ('pop', layer) - removes last item of the layer
+    ('add', layer, key, item) - adds item under key (or replaces item already stored under it)
+    ('remove', layer, key) - removes item stored under key (if there is one)
+    ('set', layer, value) - sets value of the layer
+
+Single layer is used either as a stack (push, pop), as a dictionary (add, remove) or as a value (set).
+"""
+from collections import defaultdict
+from itertools import islice
+from typing import Iterable, Iterator, List, Tuple, Any, Optional, Dict
+
+import numpy as np
+
+Operation = Tuple[Any, ...]
+Frame = List[Operation]
+
+
+class Layer:
+    """ Items of a layer kept in a growing NumPy buffer, so they can be passed to matplotlib without copying. """
+    __slots__ = ('buffer', 'size', 'rows', 'keys', 'value')
+
+    def __init__(self):
+        self.buffer: Optional[np.ndarray] = None
+        self.size = 0
+        self.rows: Dict[Any, int] = {}
+        self.keys: List[Any] = []
+        self.value = None
+
+    def items(self, shape: Tuple[int, ...] = (2, )) -> np.ndarray:
+        """ Returns view of current items (empty array of items of given shape if there are none). """
+        if self.buffer is None:
+            return np.empty((0, ) + shape)
+        return self.buffer[:self.size]
+
+    def push(self, item):
+        item = np.asarray(item, dtype='d')
+        if self.buffer is None:
+            self.buffer = np.empty((16, ) + item.shape)
+        elif self.size == len(self.buffer):
+            self.buffer = np.concatenate((self.buffer, np.empty_like(self.buffer)))
+        self.buffer[self.size] = item
+        self.size += 1
+
+    def pop(self):
+        self.size -= 1
+
+    def add(self, key, item):
+        row = self.rows.get(key)
+        if row is not None:
+            self.buffer[row] = item
+            return
+        self.rows[key] = self.size
+        self.keys.append(key)
+        self.push(item)
+
+    def remove(self, key):
+        row = self.rows.pop(key, None)
+        if row is None:
+            return
+
+        # last item is moved into place of removed one
+        last = self.size - 1
+        moved = self.keys.pop()
+        if row != last:
+            self.buffer[row] = self.buffer[last]
+            self.keys[row] = moved
+            self.rows[moved] = row
+        self.size -= 1
+
+    def clear(self):
+        self.size = 0
+        self.rows.clear()
+        self.keys.clear()
+        self.value = None
+
+
+class FrameState:
+    """ Current state of animation, built by applying delta frames one after another. """
+
+    def __init__(self):
+        self.layers: Dict[Any, Layer] = defaultdict(Layer)
+
+    def __getitem__(self, name) -> Layer:
+        return self.layers[name]
+
+    def reset(self):
+        for layer in self.layers.values():
+            layer.clear()
+
+    def snapshot(self) -> Frame:
+        """ Returns frame that builds the current state from scratch (for example to start rendering from it). """
+        frame = []
+        for name, layer in self.layers.items():
+            if layer.keys:
+                frame += [('add', name, key, layer.buffer[row].copy()) for key, row in layer.rows.items()]
+            else:
+                frame += [('push', name, item) for item in layer.items().copy()]
+            if layer.value is not None:
+                frame.append(('set', name, layer.value))
+        return frame
+
+    def apply(self, frame: Frame):
+        for operation in frame:
+            kind, layer = operation[0], self.layers[operation[1]]
+            if kind == 'push':
+                layer.push(operation[2])
+            elif kind == 'pop':
+                layer.pop()
+            elif kind == 'add':
+                layer.add(operation[2], operation[3])
+            elif kind == 'remove':
+                layer.remove(operation[2])
+            elif kind == 'set':
+                layer.value = operation[2]
+            else:
+                raise ValueError(f'Unknown operation: {kind}')
+
+
+def compact(operations: Iterable[Operation]) -> Frame:
+    """
+    Replaces sequence of operations with the shortest one with the same effect: pushes followed by pops
+    cancel out and only the last operation for every key (or value) is kept.
+    So merged frame is never bigger than the state it changes, no matter how many frames were merged.
+    """
+    pops: Dict[Any, int] = defaultdict(int)
+    pushes: Dict[Any, list] = defaultdict(list)
+    keyed: Dict[Any, dict] = defaultdict(dict)
+    values: Dict[Any, Any] = {}
+    layers = {}
+
+    for operation in operations:
+        kind, layer = operation[0], operation[1]
+        layers.setdefault(layer, None)
+        if kind == 'push':
+            pushes[layer].append(operation)
+        elif kind == 'pop':
+            if pushes[layer]:
+                pushes[layer].pop()
+            else:
+                pops[layer] += 1
+        elif kind in ('add', 'remove'):
+            keyed[layer][operation[2]] = operation
+        else:
+            values[layer] = operation
+
+    result = []
+    for layer in layers:
+        result += [('pop', layer)] * pops[layer] + pushes[layer] + list(keyed[layer].values())
+        if layer in values:
+            result.append(values[layer])
+    return result
+
+
+def merge_frames(frames: Iterable[Frame], every: int) -> Iterator[Frame]:
+    """ Merges every given number of consecutive frames into one, lazily. """
+    frames = iter(frames)
+    while True:
+        group = list(islice(frames, every))
+        if not group:
+            return
+        yield compact(operation for frame in group for operation in frame)
+
+
+def sample_frames(frames: Iterable[Frame], max_frames: int) -> List[Frame]:
+    """
+    Merges consecutive frames, so that at most max_frames frames are left, without knowing the number of
+    frames in advance: whenever there are too many of them, neighbouring ones are merged in pairs.
+    """
+    result: List[Frame] = []
+    pending: Frame = []
+    count, group = 0, 1
+    for frame in frames:
+        pending += frame
+        count += 1
+        if count == group:
+            result.append(compact(pending))
+            pending, count = [], 0
+
+        if len(result) > max_frames:
+            if len(result) % 2:
+                pending, count = result.pop() + pending, count + group
+            result = [compact(first + second) for first, second in zip(result[::2], result[1::2])]
+            group *= 2
+
+    if count:
+        result.append(compact(pending))
+        if len(result) > max_frames:
+            result[-2:] = [compact(result[-2] + result[-1])]
+    return result
+
+
+def decimate(frames: Iterable[Frame], max_frames: Optional[int] = None, every: int = 1) -> Iterable[Frame]:
+    """ Merges every given number of frames and then samples them down to at most max_frames frames. """
+    if every > 1:
+        frames = merge_frames(frames, every)
+    if max_frames is not None:
+        frames = sample_frames(frames, max_frames)
+    return frames
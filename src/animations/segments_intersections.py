@@ -1,19 +1,25 @@
+from typing import Optional
+
 import numpy as np
 import matplotlib.pyplot as plt
 from matplotlib.animation import FuncAnimation
-from sortedcontainers import SortedList
 
-from src.geometry import intersection
-from src.geometry.segments_intersections import Event, EventType
+from src.geometry.segments_intersections import bentley_ottmann_steps
 from src.visualization import plot_segments
+from src.animations.frames import FrameState, decimate
 
 
 class IntersectionsAnimation:
-    """ Creates step-by-step animation of segments intersection detection. """
+    """
+    Creates step-by-step animation of segments intersection detection.
+    Frames are delta frames (see src.animations.frames) with layers: 'events' (event points by key),
+    'intersections' (stack of found points) and 'sweep' (x coordinate of sweep line or None).
+    """
 
     def __init__(self, segments, frames):
         self.segments = segments
         self.frames = frames
+        self.state = FrameState()
 
         # init plot
         self.fig, self.ax = plt.subplots()
@@ -25,64 +31,50 @@ class IntersectionsAnimation:
         self.scatter_events = self.ax.scatter([], [], color='r')
         self.scatter_intersections = self.ax.scatter([], [], color='g')
 
-        # init animation
-        self.animation = FuncAnimation(self.fig, self.animation_step, self.frames, self.animation_init, blit=True)
+        # init animation, frames may be a generator of unknown length, so they are not cached
+        self.animation = FuncAnimation(self.fig, self.animation_step, self.frames, self.animation_init, blit=True,
+                                       cache_frame_data=False)
 
     def animation_init(self):
+        self.state.reset()
         self.scatter_events.set_offsets(np.empty((0, 2)))
         self.scatter_intersections.set_offsets(np.empty((0, 2)))
         self.line_vertical.set_xdata([0])
         return self.scatter_events, self.scatter_intersections, self.line_vertical
 
     def animation_step(self, frame):
-        events, intersections, x = frame
-        self.scatter_events.set_offsets(events or np.empty((0, 2)))
-        self.scatter_intersections.set_offsets(intersections or np.empty((0, 2)))
-        self.line_vertical.set_xdata([x])
+        self.state.apply(frame)
+        x = self.state['sweep'].value
+        self.scatter_events.set_offsets(self.state['events'].items())
+        self.scatter_intersections.set_offsets(self.state['intersections'].items())
+        self.line_vertical.set_visible(x is not None)
+        if x is not None:
+            self.line_vertical.set_xdata([x])
         return self.scatter_events, self.scatter_intersections, self.line_vertical
 
 
-def bentley_ottmann_generator(segments):
+def bentley_ottmann_generator(segments, epsilon: float = 1e-10, max_frames: Optional[int] = None, every: int = 1):
     """
-    Bentley-Ottmann algorithm in form of a generator that yields next steps for animation.
+    Bentley-Ottmann algorithm in form of a generator that yields next steps for animation (as delta frames).
+    Long runs can be sampled down to max_frames frames or every given number of frames can be merged.
     """
+    return decimate(_bentley_ottmann_frames(segments, epsilon), max_frames, every)
 
-    # create queue of events
-    events = SortedList()
-    events.update(Event(min(*seg), EventType.BEGIN, (seg, )) for seg in segments)
-    events.update(Event(max(*seg), EventType.END) for seg in segments)
-
-    # create sweep line status
-    status = SortedList()
-
-    # intersections points
-    result = set()
-
-    # while there are events to handle
-    while events:
-        yield [e.point for e in events], list(result), events[0].point[0]
-
-        event = events.pop(0)
-
-        if event.type == EventType.BEGIN:
-            for seg1 in event.segments:
-                for seg2 in status:
-                    point = intersection(*seg1, *seg2, restriction_1='segment', restriction_2='segment')
-                    if point is None:
-                        continue
-                    point = (round(point[0], 15), round(point[1], 15))
-                    if point not in result:
-                        result.add(point)
-                        events.add(Event(point, EventType.INTERSECTION))
 
-            for seg in event.segments:
-                status.add(seg)
+def _bentley_ottmann_frames(segments, epsilon: float):
 
-        elif event.type == EventType.END:
-            for seg in event.segments:
-                status.remove(seg)
+    # first frame shows all endpoints (as they are in the queue before the sweep starts)
+    frame = [('add', 'events', p, p) for p in {tuple(map(float, p)) for segment in segments for p in segment}]
 
-        elif event.type == EventType.INTERSECTION:
-            pass
+    found = 0
+    for point, _, _, result, scheduled in bentley_ottmann_steps(segments, epsilon):
+        frame.append(('remove', 'events', point))
+        frame += [('add', 'events', e[:2], e[:2]) for e in scheduled]
+        if len(result) > found:
+            frame.append(('push', 'intersections', point))
+            found = len(result)
+        frame.append(('set', 'sweep', point[0]))
+        yield frame
+        frame = []
 
-    yield [], list(result), 1000
+    yield [('set', 'sweep', None)]
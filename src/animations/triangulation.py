@@ -1,17 +1,25 @@
+from typing import Optional
+
 import matplotlib.pyplot as plt
 from matplotlib.collections import LineCollection
 
 from src.geometry import poly_to_two_chains, orient
 from src.visualization import plot_chain, plot_points
+from src.animations.frames import FrameState, decimate
 from matplotlib.animation import FuncAnimation
 
 
 class TriangulationAnimation:
-    """ Creates step-by-step animation of triangulation. """
+    """
+    Creates step-by-step animation of triangulation.
+    Frames are delta frames (see src.animations.frames) with layers: 'sweep' (y coordinate of sweep line
+    or None) and 'diagonals' (stack of found diagonals).
+    """
 
     def __init__(self, poly, frames):
         self.poly = poly
         self.frames = frames
+        self.state = FrameState()
 
         # init plot
         self.fig, self.ax = plt.subplots()
@@ -24,34 +32,49 @@ class TriangulationAnimation:
         self.lines_result = LineCollection([], colors='g')
         self.ax.add_collection(self.lines_result)
 
-        # init animation
-        self.animation = FuncAnimation(self.fig, self.animation_step, self.frames, self.animation_init, blit=True)
+        # init animation, frames may be a generator of unknown length, so they are not cached
+        self.animation = FuncAnimation(self.fig, self.animation_step, self.frames, self.animation_init, blit=True,
+                                       cache_frame_data=False)
 
     def animation_init(self):
+        self.state.reset()
         self.line_horizontal.set_ydata([0])
         self.lines_result.set_segments([])
         return self.line_horizontal,
 
     def animation_step(self, frame):
-        y, result = frame
-        self.line_horizontal.set_ydata([y])
-        self.lines_result.set_segments(result)
+        self.state.apply(frame)
+        y = self.state['sweep'].value
+        self.line_horizontal.set_visible(y is not None)
+        if y is not None:
+            self.line_horizontal.set_ydata([y])
+        self.lines_result.set_segments(self.state['diagonals'].items((2, 2)))
         return self.line_horizontal,
 
 
-def triangulate_monotonic_generator(poly):
+def triangulate_monotonic_generator(poly, max_frames: Optional[int] = None, every: int = 1):
+    """
+    Triangulation of y-monotone polygon in form of a generator that yields next steps for animation
+    (as delta frames). Long runs can be sampled down to max_frames frames or every given number of frames
+    can be merged.
+    """
+    return decimate(_triangulate_monotonic_frames(poly), max_frames, every)
+
+
+def _triangulate_monotonic_frames(poly):
 
     # get two chains
     left, right = poly_to_two_chains(poly)
 
-    yield (left[0][1], [])
+    yield [('set', 'sweep', left[0][1])]
 
     # sort chains
     left = sorted(left, key=lambda p: p[1], reverse=True)
     right = sorted(right, key=lambda p: p[1], reverse=True)
 
-    # result
+    # result (and number of diagonals already shown)
     result = []
+    shown = 0
 
     # visible vertices
     visible = [left[0]]
@@ -100,11 +123,12 @@ def triangulate_monotonic_generator(poly):
             visible = [min(blocking, key=lambda x: x[1])]
         visible.append(e)
 
-        yield(e[1], result)
+        yield [('push', 'diagonals', d) for d in result[shown:]] + [('set', 'sweep', e[1])]
+        shown = len(result)
 
     # add end vertex
     for v in visible:
         result.append((v, left[-1]))
 
-    yield (left[-1][1], result)
-    yield (-100, result)
+    yield [('push', 'diagonals', d) for d in result[shown:]] + [('set', 'sweep', left[-1][1])]
+    yield [('set', 'sweep', None)]
@@ -1,19 +1,254 @@
-from abc import ABC, abstractmethod
-from dataclasses import dataclass, field
-from typing import Any, Optional
+from typing import Any, Optional, Callable, Iterator
+
+
+def natural_order(a: Any, b: Any, context: Any = None) -> int:
+    """ Default comparator, orders keys using their own comparison operators. """
+    return (a > b) - (a < b)
 
 
 class Node:
-    key: Any
-    value: Any
-    left: Optional['Node']
-    right: Optional['Node']
+    """ Node of a binary search tree, keeps link to its parent so that all operations can be iterative. """
+    __slots__ = ('key', 'value', 'left', 'right', 'parent', 'height')
+
+    def __init__(self, key: Any, value: Any = None, parent: Optional['Node'] = None):
+        self.key = key
+        self.value = value
+        self.left: Optional['Node'] = None
+        self.right: Optional['Node'] = None
+        self.parent = parent
+        self.height = 1
 
     def find(self, key) -> Optional['Node']:
-        if key == self.key:
-            return self
-        if key < self.key and self.left:
-            return self.left.find(key)
-        if self.right:
-            return self.right.find(key)
+        """ Finds node with given key in subtree of this node, using natural order of keys. """
+        node = self
+        while node is not None:
+            if key == node.key:
+                return node
+            node = node.left if key < node.key else node.right
+        return None
+
+
+def _height(node: Optional[Node]) -> int:
+    return node.height if node is not None else 0
+
+
+class AVLTree:
+    """
+    Self balancing (AVL) binary search tree with iterative operations, so there is no recursion limit.
+
+    Keys are ordered by compare(a, b, context) function that returns negative number, zero or positive number
+    (as a < b, a == b or a > b). Context can be changed at any time (for example to current position of sweep
+    line), as long as the order of keys already in the tree stays the same. Equal keys are allowed, new key
+    is placed after keys equal to it.
+
+    Operations that modify the tree return (or take) nodes, which stay valid until they are removed, so keys
+    can be removed or swapped in time O(log n) without searching for them.
+    """
+
+    def __init__(self, compare: Callable[[Any, Any, Any], int] = natural_order, context: Any = None):
+        self.compare = compare
+        self.context = context
+        self.root: Optional[Node] = None
+        self.size = 0
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __bool__(self) -> bool:
+        return self.size > 0
+
+    def __iter__(self) -> Iterator[Any]:
+        node = self.first()
+        while node is not None:
+            yield node.key
+            node = self.successor(node)
+
+    def nodes(self) -> Iterator[Node]:
+        """ Iterates over nodes in order. """
+        node = self.first()
+        while node is not None:
+            yield node
+            node = self.successor(node)
+
+    # queries
+
+    def first(self) -> Optional[Node]:
+        """ Returns node with the smallest key. """
+        return self._leftmost(self.root) if self.root is not None else None
+
+    def last(self) -> Optional[Node]:
+        """ Returns node with the largest key. """
+        node = self.root
+        while node is not None and node.right is not None:
+            node = node.right
+        return node
+
+    def lower_bound(self, key: Any) -> Optional[Node]:
+        """ Returns first node with key not smaller than given key (or None). """
+        result = None
+        node = self.root
+        while node is not None:
+            if self.compare(node.key, key, self.context) < 0:
+                node = node.right
+            else:
+                result = node
+                node = node.left
+        return result
+
+    def upper_bound(self, key: Any) -> Optional[Node]:
+        """ Returns first node with key larger than given key (or None). """
+        result = None
+        node = self.root
+        while node is not None:
+            if self.compare(node.key, key, self.context) <= 0:
+                node = node.right
+            else:
+                result = node
+                node = node.left
+        return result
+
+    def find(self, key: Any) -> Optional[Node]:
+        """ Returns first node with key equal to given key (or None). """
+        node = self.lower_bound(key)
+        if node is not None and self.compare(node.key, key, self.context) == 0:
+            return node
         return None
+
+    def successor(self, node: Node) -> Optional[Node]:
+        """ Returns next node in order (or None). """
+        if node.right is not None:
+            return self._leftmost(node.right)
+        while node.parent is not None and node.parent.right is node:
+            node = node.parent
+        return node.parent
+
+    def predecessor(self, node: Node) -> Optional[Node]:
+        """ Returns previous node in order (or None). """
+        if node.left is not None:
+            node = node.left
+            while node.right is not None:
+                node = node.right
+            return node
+        while node.parent is not None and node.parent.left is node:
+            node = node.parent
+        return node.parent
+
+    # modifications
+
+    def insert(self, key: Any, value: Any = None) -> Node:
+        """ Inserts key (after all keys equal to it) and returns its node. """
+        parent = None
+        node = self.root
+        left = False
+        while node is not None:
+            parent = node
+            left = self.compare(key, node.key, self.context) < 0
+            node = node.left if left else node.right
+
+        node = Node(key, value, parent)
+        if parent is None:
+            self.root = node
+        elif left:
+            parent.left = node
+        else:
+            parent.right = node
+
+        self.size += 1
+        self._rebalance(parent)
+        return node
+
+    def remove(self, node: Node):
+        """ Removes given node from the tree. """
+        if node.left is not None and node.right is not None:
+            # successor (which has no left child) takes place of removed node
+            successor = self._leftmost(node.right)
+            if successor.parent is not node:
+                start = successor.parent
+                start.left = successor.right
+                if successor.right is not None:
+                    successor.right.parent = start
+                successor.right = node.right
+                node.right.parent = successor
+            else:
+                start = successor
+            successor.left = node.left
+            node.left.parent = successor
+            self._replace_child(node.parent, node, successor)
+            successor.parent = node.parent
+            successor.height = node.height
+        else:
+            child = node.left if node.left is not None else node.right
+            if child is not None:
+                child.parent = node.parent
+            self._replace_child(node.parent, node, child)
+            start = node.parent
+
+        node.left = node.right = node.parent = None
+        self.size -= 1
+        self._rebalance(start)
+
+    def swap(self, a: Node, b: Node):
+        """
+        Exchanges keys (and values) of two nodes in place, for example when two neighbouring keys change
+        their order. Caller is responsible for the order of keys to stay correct.
+        """
+        a.key, b.key = b.key, a.key
+        a.value, b.value = b.value, a.value
+
+    # balancing
+
+    @staticmethod
+    def _leftmost(node: Node) -> Node:
+        while node.left is not None:
+            node = node.left
+        return node
+
+    def _replace_child(self, parent: Optional[Node], old: Node, new: Optional[Node]):
+        if parent is None:
+            self.root = new
+        elif parent.left is old:
+            parent.left = new
+        else:
+            parent.right = new
+
+    def _rotate_left(self, node: Node) -> Node:
+        pivot = node.right
+        node.right = pivot.left
+        if pivot.left is not None:
+            pivot.left.parent = node
+        pivot.parent = node.parent
+        self._replace_child(node.parent, node, pivot)
+        pivot.left = node
+        node.parent = pivot
+        node.height = 1 + max(_height(node.left), _height(node.right))
+        pivot.height = 1 + max(_height(pivot.left), _height(pivot.right))
+        return pivot
+
+    def _rotate_right(self, node: Node) -> Node:
+        pivot = node.left
+        node.left = pivot.right
+        if pivot.right is not None:
+            pivot.right.parent = node
+        pivot.parent = node.parent
+        self._replace_child(node.parent, node, pivot)
+        pivot.right = node
+        node.parent = pivot
+        node.height = 1 + max(_height(node.left), _height(node.right))
+        pivot.height = 1 + max(_height(pivot.left), _height(pivot.right))
+        return pivot
+
+    def _rebalance(self, node: Optional[Node]):
+        """ Fixes heights and balance on the path from given node to the root. """
+        while node is not None:
+            left, right = _height(node.left), _height(node.right)
+            if left - right > 1:
+                if _height(node.left.left) < _height(node.left.right):
+                    self._rotate_left(node.left)
+                node = self._rotate_right(node)
+            elif right - left > 1:
+                if _height(node.right.right) < _height(node.right.left):
+                    self._rotate_right(node.right)
+                node = self._rotate_left(node)
+            else:
+                node.height = 1 + max(left, right)
+            node = node.parent
@@ -1,45 +1,174 @@
-from typing import List
+"""
+Random datasets. All generators take:
+    rng - source of randomness: None uses global NumPy state (np.random.seed), integer is a seed of new
+          np.random.Generator, Generator (or RandomState) is used as it is
+    out - array to write result to, or path of .npy file (written through memory map, so datasets bigger
+          than memory can be generated), by default new array is allocated
+    chunk_size - number of points generated at once, so memory needed besides output does not depend on n
+
+Result depends only on rng, n and chunk_size, chunks from iter_chunks (given the same rng) form the same
+dataset as single call, so big datasets can be also consumed in a streaming way.
+"""
+import inspect
+import os
+from typing import List, Union, Callable, Iterator, Tuple
 
 import numpy as np
 
+CHUNK_SIZE = 2 ** 20
+
+Random = Union[None, int, np.random.Generator, np.random.RandomState]
+Output = Union[None, np.ndarray, str, os.PathLike]
+
+
+def random_state(rng: Random = None):
+    """ Returns object generating random numbers for given rng (as described in module docstring). """
+    if rng is None:
+        return np.random
+    if isinstance(rng, (int, np.integer, np.random.SeedSequence)):
+        return np.random.default_rng(rng)
+    return rng
 
-def random_points_plane(n: int, corner1: np.ndarray, corner2: np.ndarray) -> np.ndarray:
-    x = np.random.uniform(size=(n, 1), low=min(corner1[0], corner2[0]), high=max(corner1[0], corner2[0]))
-    y = np.random.uniform(size=(n, 1), low=min(corner1[1], corner2[1]), high=max(corner1[1], corner2[1]))
-    return np.hstack((x, y))
 
+def _output(out: Output, shape: Tuple[int, ...]) -> np.ndarray:
+    """ Returns array to write dataset of given shape to. """
+    if out is None:
+        return np.empty(shape)
+    if isinstance(out, (str, os.PathLike)):
+        return np.lib.format.open_memmap(os.fspath(out), mode='w+', dtype='d', shape=shape)
+    if out.shape != shape:
+        raise ValueError(f'Output has shape {out.shape}, expected {shape}')
+    return out
 
-def random_points_circle(n: int, radius: float, center: np.ndarray) -> np.ndarray:
-    angles = np.random.uniform(low=0, high=2 * np.pi, size=n)
-    points = np.full((n, 2), radius, dtype='d')
-    points[:, 0] *= np.cos(angles)
-    points[:, 1] *= np.sin(angles)
-    points[:, 0] += center[0]
-    points[:, 1] += center[1]
+
+def _chunked(fill: Callable[[np.ndarray], None], points: np.ndarray, chunk_size: int) -> np.ndarray:
+    """ Fills array of points in chunks of given size. """
+    for start in range(0, len(points), chunk_size):
+        fill(points[start:start + chunk_size])
+    if isinstance(points, np.memmap):
+        points.flush()
     return points
 
 
-def random_points_segment(n: int, point1: np.ndarray, point2: np.ndarray) -> np.ndarray:
-    t = np.random.uniform(size=(n, 1))
-    return (1 - t) * point1 + t * point2
+def _single_count(generator: Callable[..., np.ndarray]) -> bool:
+    """ Checks that generator takes single count of items (n) as its first argument, rng and chunk_size. """
+    try:
+        parameters = list(inspect.signature(generator).parameters)
+    except (TypeError, ValueError):
+        return False
+    return parameters[:1] == ['n'] and 'rng' in parameters and 'chunk_size' in parameters
 
 
-def random_points_polygon(n: int, points: List[np.ndarray]) -> np.ndarray:
-    return np.vstack([
-        random_points_segment(n // len(points), points[i-1], points[i])
-        for i in range(len(points))
-    ])
+def iter_chunks(generator: Callable[..., np.ndarray], n: int, *args, rng: Random = None,
+                chunk_size: int = CHUNK_SIZE, **kwargs) -> Iterator[np.ndarray]:
+    """
+    Streaming form of given generator (for example random_points_plane): yields n items in chunks of
+    at most chunk_size items, so datasets of any size can be processed without holding them in memory.
+    Only generators of single count of items (first argument n, taking rng and chunk_size) are supported,
+    others (like random_points_weird, made of several counts) can be written to .npy file given as out.
+    """
+    if not _single_count(generator):
+        name = getattr(generator, '__name__', repr(generator))
+        raise ValueError(f'{name} does not generate single count of items (n, ..., rng=, chunk_size=), '
+                         f'it can not be split into chunks, generate it with out set to .npy path instead')
+
+    def chunks():
+        state = random_state(rng)
+        for start in range(0, n, chunk_size):
+            yield generator(min(chunk_size, n - start), *args, rng=state, chunk_size=chunk_size, **kwargs)
+
+    return chunks()
+
+
+def random_points_plane(n: int, corner1: np.ndarray, corner2: np.ndarray, rng: Random = None,
+                        out: Output = None, chunk_size: int = CHUNK_SIZE) -> np.ndarray:
+    rng = random_state(rng)
+    low, high = np.minimum(corner1, corner2), np.maximum(corner1, corner2)
+
+    def fill(points):
+        points[:, 0] = rng.uniform(size=len(points), low=low[0], high=high[0])
+        points[:, 1] = rng.uniform(size=len(points), low=low[1], high=high[1])
+
+    return _chunked(fill, _output(out, (n, 2)), chunk_size)
+
+
+def random_points_circle(n: int, radius: float, center: np.ndarray, rng: Random = None,
+                         out: Output = None, chunk_size: int = CHUNK_SIZE) -> np.ndarray:
+    rng = random_state(rng)
+
+    def fill(points):
+        angles = rng.uniform(low=0, high=2 * np.pi, size=len(points))
+        np.cos(angles, out=points[:, 0])
+        np.sin(angles, out=points[:, 1])
+        points *= radius
+        points += center
+
+    return _chunked(fill, _output(out, (n, 2)), chunk_size)
+
+
+def random_points_segment(n: int, point1: np.ndarray, point2: np.ndarray, rng: Random = None,
+                          out: Output = None, chunk_size: int = CHUNK_SIZE) -> np.ndarray:
+    rng = random_state(rng)
+    point1, point2 = np.asarray(point1, dtype='d'), np.asarray(point2, dtype='d')
+
+    def fill(points):
+        t = rng.uniform(size=(len(points), 1))
+        np.multiply(1 - t, point1, out=points)
+        points += t * point2
+
+    return _chunked(fill, _output(out, (n, 2)), chunk_size)
+
+
+def random_points_polygon(n: int, points: List[np.ndarray], rng: Random = None,
+                          out: Output = None, chunk_size: int = CHUNK_SIZE) -> np.ndarray:
+    rng = random_state(rng)
+    count = n // len(points)
+    out = _output(out, (count * len(points), 2))
+    for i in range(len(points)):
+        random_points_segment(count, points[i - 1], points[i], rng, out[i * count:(i + 1) * count], chunk_size)
+    return out
 
 
 def random_points_weird(n_edge: int, n_diagonal: int,
-                        p1: np.ndarray, p2: np.ndarray, p3: np.ndarray, p4: np.ndarray) -> np.ndarray:
+                        p1: np.ndarray, p2: np.ndarray, p3: np.ndarray, p4: np.ndarray, rng: Random = None,
+                        out: Output = None, chunk_size: int = CHUNK_SIZE) -> np.ndarray:
+    rng = random_state(rng)
+    out = _output(out, (4 + 2 * n_edge + 2 * n_diagonal, 2))
+    out[:4] = p1, p2, p3, p4
+    start = 4
+    for n, begin, end in ((n_edge, p1, p2), (n_edge, p2, p3), (n_diagonal, p1, p3), (n_diagonal, p2, p4)):
+        random_points_segment(n, begin, end, rng, out[start:start + n], chunk_size)
+        start += n
+    return out
+
+
+def random_segments_plane(n: int, corner1: np.ndarray, corner2: np.ndarray, rng: Random = None,
+                          out: Output = None, chunk_size: int = CHUNK_SIZE) -> np.ndarray:
+    """ Segments with both ends drawn uniformly from rectangle with given corners (chunk_size counts ends). """
+    out = _output(out, (n, 2, 2))
+    if not out.flags.c_contiguous:
+        raise ValueError('Output has to be C-contiguous')
+    random_points_plane(2 * n, corner1, corner2, rng, out.reshape(-1, 2), chunk_size)
+    return out
+
+
+def random_monotone_polygon(n: int, corner1: np.ndarray, corner2: np.ndarray,
+                            rng: Random = None) -> np.ndarray:
+    """ Random y-monotone polygon (counter-clockwise) with n vertices inside rectangle with given corners. """
+    rng = random_state(rng)
+    low, high = np.minimum(corner1, corner2), np.maximum(corner1, corner2)
+    middle = (low[0] + high[0]) / 2
+
+    # each vertex goes to left or right chain, chains are separated by vertical line through the middle
+    ys = np.sort(rng.uniform(size=n - 2, low=low[1], high=high[1]))[::-1]
+    on_left = rng.uniform(size=n - 2) < 0.5
+    xs = np.where(on_left, rng.uniform(size=n - 2, low=low[0], high=middle),
+                  rng.uniform(size=n - 2, low=middle, high=high[0]))
+    chains = np.stack((xs, ys), axis=1)
+
     return np.vstack([
-        [p1], [p2], [p3], [p4],
-        random_points_segment(n_edge, p1, p2),
-        random_points_segment(n_edge, p2, p3),
-        random_points_segment(n_diagonal, p1, p3),
-        random_points_segment(n_diagonal, p2, p4),
+        [[middle, high[1]]],
+        chains[on_left],
+        [[middle, low[1]]],
+        chains[~on_left][::-1],
     ])
-
-def random_segments_plane(n: int, corner1: np.ndarray, corner2: np.ndarray) -> np.ndarray:
-    return np.resize(random_points_plane(2 * n, corner1, corner2), (n, 2, 2))
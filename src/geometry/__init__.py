@@ -1,4 +1,5 @@
-from .utils import orient, dist2, intersection, parametric_intersection
-from .convex_hull import graham, jarvis
-from .segments_intersections import bentley_ottmann
-from .triangulation import to_polygon, is_y_monotonic, classify_poly, classify_vertex, poly_to_two_chains, triangulate_monotonic
+from .utils import orient, orient_batch, orient_many, orient_robust, orient_robust_batch, orient_translated, orient_translated_batch, orient_exact, orient_predicates, orient_masks, classify_orient, dist2, intersection, parametric_intersection, intersection_batch, parametric_intersection_batch
+from .convex_hull import graham, graham_indices, jarvis, jarvis_indices, chan, chan_indices, quickhull, quickhull_indices, akl_toussaint, IncrementalHull, parallel_hull, parallel_hull_indices
+from .segments_intersections import bentley_ottmann, parallel_bentley_ottmann, grid_intersections, SegmentIndex
+from .triangulation import to_polygon, is_y_monotonic, classify_poly, classify_vertex, poly_to_two_chains, triangulate_monotonic, triangulate_monotonic_linear, monotone_triangles, monotone_pieces, polygon_triangles, triangulate, HalfEdgeMesh
+from .point_location import PointLocation
@@ -1,89 +1,699 @@
-from functools import cmp_to_key, partial
+import os
+from concurrent.futures import ProcessPoolExecutor
+from fractions import Fraction
+from functools import cmp_to_key
+from typing import Tuple, Optional
+
+try:
+    from multiprocessing import shared_memory
+except ImportError:
+    # Python 3.7
+    shared_memory = None
 
 import numpy as np
 
-from src.geometry import orient, dist2
+from src import instrumentation
+from src.binarytree import AVLTree
+from src.geometry import orient_many, orient_robust, orient_robust_batch, orient_exact, orient_predicates, dist2
+
+# size of groups of Chan's algorithm (and so guess of hull size), small groups are not worth per group overhead
+# of NumPy calls
+CHAN_GROUP_SIZE = 256
+
+# single step of gift wrapping over hulls of groups costs about as much as Graham scan of this number of points
+# (plus the second number for every group), wrapping is not tried if Graham scan costs less than this number of
+# steps (too small hulls to be worth hulls of groups)
+CHAN_STEP_POINTS = 1000
+CHAN_GROUP_POINTS = 4
+CHAN_MIN_STEPS = 16
+
+
+def lowest_point(points: np.ndarray) -> int:
+    """ Returns index of point with lowest y coordinate (and lowest x in case of a tie). """
+    points = np.asarray(points)
+    candidates = np.flatnonzero(points[:, 1] == points[:, 1].min())
+    return candidates[np.argmin(points[candidates, 0])]
 
 
-def graham(points: np.ndarray, epsilon: float = 1e-10):
+def akl_toussaint(points: np.ndarray, octagon: bool = True,
+                  epsilon: Optional[float] = 1e-10) -> Tuple[np.ndarray, int]:
     """
-    Implements Graham scan for finding convex hull in time O(n log n).
-    https://en.wikipedia.org/wiki/Graham_scan
+    Akl-Toussaint heuristic, eliminates points that lie strictly inside polygon spanned by extreme points
+    (in 4 or 8 directions) as they can not be vertices of convex hull.
+    Returns indices of remaining points and number of eliminated points.
+    Epsilon set to None means exact mode (with robust orient), the same as in all algorithms below.
+    https://en.wikipedia.org/wiki/Convex_hull_algorithms#Akl%E2%80%93Toussaint_heuristic
     """
+    points = np.asarray(points, dtype='d')
+    _, orientation, epsilon = orient_predicates(epsilon)
+
+    # extreme points in directions ordered counter-clockwise, so they form a convex polygon
+    if octagon:
+        directions = np.array([[0, -1], [1, -1], [1, 0], [1, 1], [0, 1], [-1, 1], [-1, 0], [-1, -1]], dtype='d')
+    else:
+        directions = np.array([[0, -1], [1, 0], [0, 1], [-1, 0]], dtype='d')
+    extremes = np.argmax(points @ directions.T, axis=0)
+
+    # remove repeated vertices
+    polygon = points[extremes]
+    polygon = polygon[np.any(polygon != np.roll(polygon, 1, axis=0), axis=1)]
+    if len(polygon) < 3:
+        return np.arange(len(points)), 0
+
+    # point is eliminated if it is strictly on the left side of every edge (orient is translated, so it is
+    # exactly 0 for vertices of polygon, which are also kept explicitly, as they are extreme points)
+    inside = np.ones(len(points), dtype=bool)
+    for a, b in zip(polygon, np.roll(polygon, -1, axis=0)):
+        inside &= orientation(a, b, points) > epsilon
+    inside[extremes] = False
+
+    return np.flatnonzero(~inside), int(np.count_nonzero(inside))
+
+
+def polar_order(points: np.ndarray, epsilon: Optional[float] = 1e-10) -> Tuple[int, np.ndarray]:
+    """
+    Returns index of lowest point and indices of remaining points sorted by polar angle around it.
+    Sorting uses np.lexsort on (angle, distance) keys and co-linear points (relative to lowest point)
+    are removed in a single vectorized pass, so that only the farthest of them is kept.
+    In exact mode points with almost equal angles are sorted again with robust orient.
+    """
+    _, orientation, tolerance = orient_predicates(epsilon)
 
     # find first point (with lowest y then x) and remove it from points
-    i0 = min(enumerate(points), key=lambda x: (x[1][1], x[1][0]))[0]
+    i0 = lowest_point(points)
     p0 = points[i0]
-    points = points[np.arange(points.shape[0]) != i0]
-
-    # sort points by orient relative to p0
-    points = sorted(points, key=cmp_to_key(partial(orient, p0)), reverse=True)
-
-    # remove points that are co-linear
-    i = 0
-    while i < len(points)-1:
-        # if they are not co-linear continue
-        if abs(orient(p0, points[i], points[i+1])) > epsilon:
-            i += 1
-        # if they are co-linear and i is closer then i+1
-        elif dist2(p0, points[i]) < dist2(p0, points[i+1]):
-            del points[i]
-        # if they are co-linear and i+1 is closer than i
-        else:
-            del points[i+1]
+    rest = np.flatnonzero(np.arange(points.shape[0]) != i0)
+
+    # sort points by angle relative to p0, closer ones first
+    delta = points[rest] - p0
+    angles = np.arctan2(delta[:, 1], delta[:, 0])
+    order = np.lexsort((dist2(p0, points[rest]), angles))
+    order, angles = rest[order], angles[order]
+    if len(order) < 2:
+        return i0, order
+    if epsilon is None:
+        order = _fix_polar_order(points, p0, order, angles)
+
+    # group neighbouring points that are co-linear with p0
+    colinear = np.abs(orientation(p0, points[order[:-1]], points[order[1:]])) <= tolerance
+    groups = np.concatenate(([0], np.cumsum(~colinear)))
+
+    # keep only farthest point from each group
+    by_distance = np.lexsort((dist2(p0, points[order]), groups))
+    last = np.append(groups[1:] != groups[:-1], True)
+    return i0, order[by_distance[last]]
 
-    # initialize stack
-    hull = [p0]
+
+def _fix_polar_order(points: np.ndarray, p0: np.ndarray, order: np.ndarray, angles: np.ndarray) -> np.ndarray:
+    """ Sorts again (with robust orient) runs of points which angles are too close to be compared. """
+
+    def compare(i, j):
+        value = orient_robust(p0, points[i], points[j])
+        if value != 0:
+            return -1 if value > 0 else 1
+        return -1 if dist2(p0, points[i]) < dist2(p0, points[j]) else 1
+
+    # arctan2 is accurate to a few units in the last place
+    close = np.diff(angles) <= 8 * np.spacing(angles[1:])
+    starts = np.flatnonzero(close & ~np.concatenate(([False], close[:-1])))
+    ends = np.flatnonzero(close & ~np.concatenate((close[1:], [False]))) + 2
+    order = order.copy()
+    for start, end in zip(starts, ends):
+        order[start:end] = sorted(order[start:end], key=cmp_to_key(compare))
+    return order
+
+
+def graham_indices(points: np.ndarray, epsilon: Optional[float] = 1e-10, prefilter: bool = False) -> np.ndarray:
+    """
+    Array based Graham scan, returns indices of convex hull vertices in counter-clockwise order
+    starting from the lowest point. Runs in time O(n log n) with sorting done by NumPy.
+    With prefilter set, interior points are eliminated first using akl_toussaint.
+    With epsilon set to None all orientation tests are exact (using orient_robust).
+    """
+    points = np.asarray(points, dtype='d')
+    if prefilter:
+        with instrumentation.phase('filter'):
+            remaining, _ = akl_toussaint(points, epsilon=epsilon)
+        return remaining[graham_indices(points[remaining], epsilon)]
+
+    with instrumentation.phase('sort'):
+        i0, order = polar_order(points, epsilon)
+    order = np.concatenate(([i0], order))
+
+    # plain floats are much faster to operate on than NumPy scalars
+    xs = points[order, 0].tolist()
+    ys = points[order, 1].tolist()
+
+    # initialize stack (of positions in order)
+    hull = [0]
 
     # main loop
-    i = 0
-    while i < len(points):
-        # if its on the right
-        if len(hull) < 2 or orient(hull[-2], hull[-1], points[i]) > epsilon:
-            hull.append(points[i])
-            i += 1
-        # if its on the left
-        else:
-            hull.pop()
+    with instrumentation.phase('scan'):
+        for i in range(1, len(order)):
+            cx, cy = xs[i], ys[i]
 
-    return hull
+            # pop points that would make a turn to the right (orient_translated is inlined as this loop is
+            # the hot path)
+            while len(hull) >= 2:
+                ax, ay, bx, by = xs[hull[-2]], ys[hull[-2]], xs[hull[-1]], ys[hull[-1]]
+                if epsilon is None:
+                    if orient_robust((ax, ay), (bx, by), (cx, cy)) > 0:
+                        break
+                elif (ax - cx) * (by - cy) - (ay - cy) * (bx - cx) > epsilon:
+                    break
+                hull.pop()
+
+            hull.append(i)
+
+    # every point is pushed once, so stack operations are counted after the loop
+    stats = instrumentation.active()
+    if stats is not None:
+        pops = len(order) - len(hull)
+        stats.count('stack pushes', len(order))
+        stats.count('stack pops', pops)
+        if epsilon is not None:
+            # inlined orient is evaluated before every pop and once more for every point but the first two
+            # (the lowest point and the first one after it are never popped)
+            stats.count('orient calls', pops + max(len(order) - 2, 0))
 
+    return order[hull]
 
-def jarvis(points: np.ndarray, epsilon: float = 1e-10):
+
+def graham(points: np.ndarray, epsilon: Optional[float] = 1e-10, prefilter: bool = False):
     """
-    Implements Jarvis (or Gift wrapping) algorithm for finding convex hull in time O(nh) where h is size of convex hull.
-    https://en.wikipedia.org/wiki/Gift_wrapping_algorithm
+    Implements Graham scan for finding convex hull in time O(n log n).
+    https://en.wikipedia.org/wiki/Graham_scan
+    """
+    points = np.asarray(points)
+    return list(points[graham_indices(points, epsilon, prefilter)])
+
+
+def wrap_step(points: np.ndarray, current: np.ndarray, direction: np.ndarray, epsilon: Optional[float] = 1e-10) -> int:
+    """
+    Single step of gift wrapping done as one NumPy reduction over all candidates. Returns index (in points)
+    of point that makes the smallest counter-clockwise turn from given direction when seen from current
+    point (so that all other points are on its left), farthest one in case of co-linear candidates.
+    Returns -1 if there is no point different than current.
+    """
+    delta = points - current
+    distances = dist2(current, points)
+
+    # angle of counter-clockwise turn from direction, points equal to current are never selected
+    angles = np.arctan2(direction[0] * delta[:, 1] - direction[1] * delta[:, 0], delta @ direction)
+    angles[angles < 0] += 2 * np.pi
+    angles[distances == 0] = np.inf
+    best = np.argmin(angles)
+    if not np.isfinite(angles[best]):
+        return -1
+    return _farthest_colinear(points, current, best, delta, distances, epsilon)
+
+
+def _farthest_colinear(points: np.ndarray, current: np.ndarray, best: int, delta: np.ndarray,
+                       distances: np.ndarray, epsilon: Optional[float]) -> int:
+    """
+    Out of points co-linear with current and best (on the same side of current) selects the farthest one.
+    In exact mode best (found by comparing angles) is first corrected, until no point is strictly on the right
+    of line from current through it. All points have to be within angle smaller than pi seen from current.
     """
+    if epsilon is None:
+        values = orient_robust_batch(current, points[best], points)
+        for _ in range(len(points)):
+            right = np.flatnonzero(values < 0)
+            if len(right) == 0:
+                break
+            best = right[np.argmin(values[right])]
+            values = orient_robust_batch(current, points[best], points)
+        colinear = (values == 0) & (delta @ delta[best] > 0)
+    else:
+        colinear = (np.abs(orient_many(current, points[best], points)) <= epsilon) & (delta @ delta[best] > 0)
+
+    candidates = np.flatnonzero(colinear)
+    if len(candidates) == 0:
+        return best
+    return candidates[np.argmax(distances[candidates])]
+
+
+def _closes(current: np.ndarray, best: np.ndarray, first: np.ndarray, epsilon: Optional[float]) -> bool:
+    """ Checks if edge from current to best closes the hull, that is if it reaches (or passes over) first point. """
+    orientation, _, epsilon = orient_predicates(epsilon)
+    return bool(np.all(best == first)) or (abs(orientation(current, best, first)) <= epsilon
+                                           and np.dot(first - current, best - current) > 0)
+
+
+def jarvis_indices(points: np.ndarray, epsilon: Optional[float] = 1e-10, prefilter: bool = False) -> np.ndarray:
+    """
+    Gift wrapping with inner loop replaced by wrap_step, returns indices of convex hull vertices
+    in counter-clockwise order starting from the lowest point.
+    With prefilter set, interior points are eliminated first using akl_toussaint.
+    """
+    points = np.asarray(points, dtype='d')
+    if prefilter:
+        with instrumentation.phase('filter'):
+            remaining, _ = akl_toussaint(points, epsilon=epsilon)
+        return remaining[jarvis_indices(points[remaining], epsilon)]
 
     # find first point (with lowest y then x)
-    p0 = points[min(enumerate(points), key=lambda x: (x[1][1], x[1][0]))[0]]
+    i0 = lowest_point(points)
 
-    # init hull
-    hull = [p0]
+    # init hull, first edge is looked for to the right of the lowest point
+    hull = [i0]
+    visited = {i0}
+    direction = np.array([1.0, 0.0])
 
     # main loop
-    for i in range(len(points)):
-
-        # find right most point relative to last in hull
-        best = None
-        for p in points:
-
-            # if there is no best
-            if best is None:
-                best = p
-            # if p is more to the right than best
-            elif orient(hull[-1], best, p) < -epsilon:
-                best = p
-            # if p and best are co-linear and best is closer than p
-            elif -epsilon < orient(hull[-1], best, p) < epsilon and dist2(hull[-1], best) < dist2(hull[-1], p):
-                best = p
-
-        # stop main loop if hull is closed
-        if np.all(best == hull[0]):
+    with instrumentation.phase('wrap'):
+        for _ in range(len(points)):
+            best = wrap_step(points, points[hull[-1]], direction, epsilon)
+
+            # stop main loop if hull is closed
+            if best < 0 or best in visited or _closes(points[hull[-1]], points[best], points[i0], epsilon):
+                break
+
+            # add found point to hull
+            direction = points[best] - points[hull[-1]]
+            hull.append(best)
+            visited.add(best)
+
+    # hull starts with the lowest point and every step but the last one adds a point to it
+    stats = instrumentation.active()
+    if stats is not None:
+        stats.count('wrap steps', len(hull))
+
+    return np.array(hull, dtype=np.intp)
+
+
+def jarvis(points: np.ndarray, epsilon: Optional[float] = 1e-10, prefilter: bool = False):
+    """
+    Implements Jarvis (or Gift wrapping) algorithm for finding convex hull in time O(nh) where h is size of convex hull.
+    https://en.wikipedia.org/wiki/Gift_wrapping_algorithm
+    """
+    points = np.asarray(points)
+    return list(points[jarvis_indices(points, epsilon, prefilter)])
+
+
+def tangents(points: np.ndarray, hulls: np.ndarray, lengths: np.ndarray, p: np.ndarray,
+             epsilon: Optional[float] = 1e-10) -> np.ndarray:
+    """
+    Finds tangents from point p to many convex polygons at once, using binary search in time O(log m).
+    Polygons are given as rows of hulls (indices of points in counter-clockwise order, padded to common
+    length) with their lengths. For every polygon returns position (in its row) of vertex q such that
+    all vertices of polygon are on the left of (or on) line from p to q.
+    Based on: http://geomalgorithms.com/a15-_tangents.html by Dan Sunday.
+    """
+    count = len(lengths)
+    result = np.full(count, -1, dtype=np.intp)
+    exact = epsilon
+    _, orientation, epsilon = orient_predicates(epsilon)
+
+    def side(rows, i, j):
+        # positive if vertex j is above (on the left side of) line from p through vertex i, negative if below
+        return orientation(p, points[hulls[rows, i % lengths[rows]]], points[hulls[rows, j % lengths[rows]]])
+
+    # polygons with less than three vertices are handled directly
+    rows = np.flatnonzero(lengths >= 3)
+    small = np.flatnonzero(lengths < 3)
+
+    # test if first vertex is the tangent
+    zero = np.zeros(len(rows), dtype=np.intp)
+    found = (side(rows, zero + 1, zero) < -epsilon) & (side(rows, lengths[rows] - 1, zero) <= epsilon)
+    result[rows[found]] = 0
+    rows = rows[~found]
+
+    # binary search on chains [a, b], vertex b is the same as vertex 0
+    a = np.zeros(len(rows), dtype=np.intp)
+    b = lengths[rows].copy()
+    for _ in range(2 * int(np.log2(max(lengths.max(initial=1), 1))) + 4):
+        if len(rows) == 0:
             break
 
-        # add found point to hull
-        hull.append(best)
+        c = (a + b) // 2
+        down_c = side(rows, c + 1, c) < -epsilon
+        found = down_c & (side(rows, c - 1, c) <= epsilon)
+        result[rows[found]] = c[found]
+
+        # pick one of subchains [a, c] or [c, b]
+        up_a = side(rows, a + 1, a) > epsilon
+        a_to_c = side(rows, a, c)
+        first = np.where(up_a, down_c | (a_to_c > epsilon), down_c & (a_to_c < -epsilon))
+        b = np.where(first, c, b)
+        a = np.where(first, a, c)
+
+        # degenerate chains (for example with co-linear vertices) are left for the direct search
+        keep = ~found & (b - a > 1)
+        small = np.concatenate((small, rows[~found & ~keep]))
+        rows, a, b = rows[keep], a[keep], b[keep]
 
+    # direct search for what is left
+    for row in np.concatenate((small, rows)):
+        result[row] = _tangent_direct(points[hulls[row, :lengths[row]]], p, exact)
+
+    return result
+
+
+def _tangent_direct(vertices: np.ndarray, p: np.ndarray, epsilon: Optional[float]) -> int:
+    """ Finds tangent from point p to convex polygon by checking all of its vertices at once. """
+    delta = vertices - p
+    distances = dist2(p, vertices)
+
+    # seen from p all vertices are within angle smaller than pi, so angles relative to any of them do not wrap
+    reference = delta[np.argmax(distances)]
+    angles = np.arctan2(reference[0] * delta[:, 1] - reference[1] * delta[:, 0], delta @ reference)
+    angles[distances == 0] = np.inf
+    best = np.argmin(angles)
+    if not np.isfinite(angles[best]):
+        return 0
+    return _farthest_colinear(vertices, p, best, delta, distances, epsilon)
+
+
+def chan_indices(points: np.ndarray, epsilon: Optional[float] = 1e-10, prefilter: bool = False) -> np.ndarray:
+    """
+    Chan's algorithm, returns indices of convex hull vertices in counter-clockwise order starting from
+    the lowest point. Small hulls (up to number of vertices growing with n, see CHAN_STEP_POINTS) are found
+    by gift wrapping over hulls of groups, bigger ones (and small inputs) are computed with graham_indices,
+    so a wrong guess of hull size costs about as much as one more Graham scan.
+    With prefilter set, interior points are eliminated first using akl_toussaint.
+    """
+    points = np.asarray(points, dtype='d')
+    if prefilter:
+        remaining, _ = akl_toussaint(points, epsilon=epsilon)
+        return remaining[chan_indices(points[remaining], epsilon)]
+
+    # Chan's algorithm squares the guess of hull size after every failed round, but group hulls of the next
+    # guess (65536) already cost as much as Graham scan of all points, so the guess is made once and the number
+    # of wrapping steps is limited to what costs less than Graham scan, which is used if the hull is bigger
+    n = len(points)
+    m = CHAN_GROUP_SIZE
+    steps = min(m, n // (CHAN_STEP_POINTS + CHAN_GROUP_POINTS * -(-n // m)))
+    if m >= n or steps < CHAN_MIN_STEPS:
+        return graham_indices(points, epsilon)
+
+    hull = _chan_wrap(points, lowest_point(points), m, steps, epsilon)
+    return graham_indices(points, epsilon) if hull is None else hull
+
+
+def _chan_wrap(points: np.ndarray, i0: int, m: int, steps: int, epsilon: Optional[float]):
+    """
+    Single pass of Chan's algorithm with groups of size m, returns None if hull has more vertices than
+    given number of steps (at most m).
+    """
+
+    # convex hull of every group with array based Graham scan
+    groups = [start + graham_indices(points[start:start + m], epsilon) for start in range(0, len(points), m)]
+    lengths = np.array([len(group) for group in groups], dtype=np.intp)
+    hulls = np.zeros((len(groups), lengths.max()), dtype=np.intp)
+    for row, group in enumerate(groups):
+        hulls[row, :len(group)] = group
+
+    # group and position in it of the current point
+    group = i0 // m
+    position = int(np.flatnonzero(np.all(points[groups[group]] == points[i0], axis=1))[0])
+
+    hull = [i0]
+    visited = {i0}
+    direction = np.array([1.0, 0.0])
+    for _ in range(steps):
+        current = points[hull[-1]]
+
+        # candidates are tangents to other groups and next vertex of current group
+        positions = tangents(points, hulls, lengths, current, epsilon)
+        positions[group] = (position + 1) % lengths[group]
+        candidates = hulls[np.arange(len(groups)), positions]
+
+        # best candidate is selected with single step of gift wrapping
+        best = wrap_step(points[candidates], current, direction, epsilon)
+        if best < 0 or candidates[best] in visited or _closes(current, points[candidates[best]], points[i0], epsilon):
+            return np.array(hull, dtype=np.intp)
+
+        group, position = best, positions[best]
+        direction = points[candidates[best]] - current
+        hull.append(candidates[best])
+        visited.add(candidates[best])
+
+    return None
+
+
+def chan(points: np.ndarray, epsilon: Optional[float] = 1e-10, prefilter: bool = False):
+    """
+    Implements Chan's algorithm for finding convex hull in time O(n log h) where h is size of convex hull.
+    https://en.wikipedia.org/wiki/Chan%27s_algorithm
+    """
+    points = np.asarray(points)
+    return list(points[chan_indices(points, epsilon, prefilter)])
+
+
+def quickhull_indices(points: np.ndarray, epsilon: Optional[float] = 1e-10) -> np.ndarray:
+    """
+    Vectorized Quickhull, returns indices of convex hull vertices in counter-clockwise order starting from
+    the lowest point. Every partitioning step is a single orient_many call over remaining points.
+    Runs in expected time O(n log n), O(n^2) in the worst case.
+    """
+    points = np.asarray(points, dtype='d')
+    i0 = lowest_point(points)
+    exact = epsilon is None
+    _, orientation, epsilon = orient_predicates(epsilon)
+
+    # leftmost and rightmost points are always on the hull
+    order = np.lexsort((points[:, 1], points[:, 0]))
+    left, right = order[0], order[-1]
+    if np.all(points[left] == points[right]):
+        return np.array([i0], dtype=np.intp)
+
+    # points on the right side of directed line are outside of the hull
+    values = orientation(points[left], points[right], points)
+    below = np.flatnonzero(values < -epsilon)
+    above = np.flatnonzero(values > epsilon)
+
+    # explicit stack of edges to process and vertices to output (there is no recursion limit on big inputs)
+    hull = []
+    stack = [(right, left, above), right, (left, right, below), left]
+    while stack:
+        task = stack.pop()
+        if not isinstance(task, tuple):
+            hull.append(task)
+            continue
+
+        # find farthest point from edge (the one closest to b out of equally far points, so that points
+        # co-linear with it are never selected) and split remaining points between two new edges
+        a, b, outside = task
+        if len(outside) == 0:
+            continue
+        values = orientation(points[a], points[b], points[outside])
+        if exact:
+            c = _farthest_exact(points, a, b, outside[values <= values.min() * (1 - 1e-9)])
+        else:
+            farthest = outside[values <= values.min() + epsilon]
+            c = farthest[np.argmax(points[farthest] @ (points[b] - points[a]))]
+        # ends of new edges never go back to their problems (even if rounding puts them outside)
+        outside = outside[(outside != a) & (outside != b) & (outside != c)]
+        stack.append((c, b, outside[orientation(points[c], points[b], points[outside]) < -epsilon]))
+        stack.append(c)
+        stack.append((a, c, outside[orientation(points[a], points[c], points[outside]) < -epsilon]))
+
+    # rotate, so that hull starts with the lowest point
+    hull = np.array(hull, dtype=np.intp)
+    start = np.flatnonzero(np.all(points[hull] == points[i0], axis=1))[0]
+    hull = np.roll(hull, -start)
+    hull[0] = i0
     return hull
 
+
+def _farthest_exact(points: np.ndarray, a: int, b: int, candidates: np.ndarray) -> int:
+    """ Out of candidates (almost equally far from line from a to b) selects the farthest one, closest to b. """
+    if len(candidates) == 1:
+        return candidates[0]
+
+    def key(i):
+        (ax, ay), (bx, by), (x, y) = [map(Fraction, points[j]) for j in (a, b, i)]
+        return orient_exact((ax, ay), (bx, by), (x, y)), -((x - ax) * (bx - ax) + (y - ay) * (by - ay))
+
+    return min(candidates, key=key)
+
+
+def quickhull(points: np.ndarray, epsilon: Optional[float] = 1e-10):
+    """
+    Implements Quickhull algorithm for finding convex hull in expected time O(n log n).
+    https://en.wikipedia.org/wiki/Quickhull
+    """
+    points = np.asarray(points)
+    return list(points[quickhull_indices(points, epsilon)])
+
+
+def _chunk_hull(points: np.ndarray, start: int) -> np.ndarray:
+    """
+    Returns global indices of vertices of exact hull of a chunk of points (starting at given index). Exact hull
+    keeps every point that can be a vertex of the whole hull, with any tolerance used to compute it.
+    """
+    return start + graham_indices(points, None, prefilter=True)
+
+
+def _shared_chunk_hull(name: str, shape: Tuple[int, ...], start: int, stop: int) -> np.ndarray:
+    """ Computes hull of a chunk of points stored in shared memory, returns global indices of its vertices. """
+    memory = shared_memory.SharedMemory(name=name)
+    points = np.ndarray(shape, dtype='d', buffer=memory.buf)
+    try:
+        return _chunk_hull(points[start:stop], start)
+    finally:
+        # view of shared memory has to be released before it is closed
+        del points
+        memory.close()
+
+
+def parallel_hull_indices(points: np.ndarray, epsilon: Optional[float] = 1e-10, workers: Optional[int] = None,
+                          min_parallel: int = 10 ** 6) -> np.ndarray:
+    """
+    Parallel convex hull, returns indices of hull vertices in counter-clockwise order starting from
+    the lowest point (the same hull as graham_indices). Points are copied once into shared memory
+    (on Python 3.7, which has no shared memory, chunks are sent to workers as arrays), exact hulls of chunks
+    of them are computed by a pool of worker processes and the hull is computed with given tolerance
+    once more out of vertices of partial hulls. Inputs smaller than min_parallel (or single worker)
+    are processed serially.
+    """
+    points = np.asarray(points, dtype='d')
+    workers = os.cpu_count() if workers is None else workers
+    if len(points) < min_parallel or workers <= 1:
+        return graham_indices(points, epsilon)
+
+    # few chunks per worker, so that uneven chunks are balanced
+    bounds = np.linspace(0, len(points), 2 * workers + 1).astype(int)
+    chunks = list(zip(bounds[:-1], bounds[1:]))
+    if shared_memory is None:
+        with ProcessPoolExecutor(workers) as pool:
+            partial = list(pool.map(_chunk_hull, [points[start:stop] for start, stop in chunks],
+                                    [start for start, _ in chunks]))
+    else:
+        memory = shared_memory.SharedMemory(create=True, size=points.nbytes)
+        try:
+            np.ndarray(points.shape, dtype='d', buffer=memory.buf)[:] = points
+            with ProcessPoolExecutor(workers) as pool:
+                partial = list(pool.map(_shared_chunk_hull, *zip(*[(memory.name, points.shape, start, stop)
+                                                                   for start, stop in chunks])))
+        finally:
+            memory.close()
+            memory.unlink()
+
+    candidates = np.sort(np.concatenate(partial))
+    return candidates[graham_indices(points[candidates], epsilon)]
+
+
+def parallel_hull(points: np.ndarray, epsilon: Optional[float] = 1e-10, workers: Optional[int] = None,
+                  min_parallel: int = 10 ** 6):
+    """ Convex hull computed on many processors (see parallel_hull_indices), returns the same points as graham. """
+    points = np.asarray(points)
+    return list(points[parallel_hull_indices(points, epsilon, workers, min_parallel)])
+
+
+class IncrementalHull:
+    """
+    Convex hull of a growing set of points. Lower and upper chains of the hull (as in Andrew's monotone chain
+    algorithm) are kept in balanced trees ordered by (x, y), every node stores key of the next vertex
+    of its chain. Points are added in amortized time O(log n) (every vertex is removed at most once)
+    and queries take time O(log n).
+    With epsilon set to None (default) orientation tests are exact, so the hull is exactly the same
+    as the one returned by graham(points, epsilon=None).
+    """
+
+    def __init__(self, points: Optional[np.ndarray] = None, epsilon: Optional[float] = None):
+        self.epsilon = epsilon
+        self.orient, _, self.tolerance = orient_predicates(epsilon)
+
+        # lower chain turns left and upper chain turns right (when going from left to right)
+        self.lower = AVLTree()
+        self.upper = AVLTree()
+        if points is not None:
+            self.extend(points)
+
+    def __len__(self) -> int:
+        if len(self.lower) <= 1:
+            return len(self.lower)
+        return len(self.lower) + len(self.upper) - 2
+
+    def add(self, point) -> bool:
+        """ Adds point, returns True if it became a vertex of the hull. """
+        point = (float(point[0]), float(point[1]))
+        lower = self._insert(self.lower, point, 1)
+        upper = self._insert(self.upper, point, -1)
+        return lower or upper
+
+    def extend(self, points: np.ndarray):
+        """ Adds many points, only vertices of their own convex hull have to be inserted one by one. """
+        points = np.asarray(points, dtype='d').reshape(-1, 2)
+        if len(points) == 0:
+            return
+        for point in points[graham_indices(points, self.epsilon)].tolist():
+            self.add(point)
+
+    def _insert(self, chain: AVLTree, point: Tuple[float, float], sign: int) -> bool:
+        """ Inserts point into chain (if it is outside of it) and removes vertices that are no longer convex. """
+        orientation, tolerance = self.orient, self.tolerance
+
+        # point between two vertices of chain, on the inner side of edge connecting them, is not a vertex
+        successor = chain.lower_bound(point)
+        if successor is not None and successor.key == point:
+            return False
+        predecessor = chain.predecessor(successor) if successor is not None else chain.last()
+        if predecessor is not None and successor is not None \
+                and sign * orientation(predecessor.key, successor.key, point) >= -tolerance:
+            return False
+
+        node = chain.insert(point)
+
+        # remove vertices on the left and on the right, that do not make a convex turn any more
+        while predecessor is not None:
+            before = chain.predecessor(predecessor)
+            if before is None or sign * orientation(before.key, predecessor.key, point) > tolerance:
+                break
+            chain.remove(predecessor)
+            predecessor = before
+        while successor is not None:
+            after = chain.successor(successor)
+            if after is None or sign * orientation(point, successor.key, after.key) > tolerance:
+                break
+            chain.remove(successor)
+            successor = after
+
+        # every vertex knows the next one
+        if predecessor is not None:
+            predecessor.value = point
+        node.value = successor.key if successor is not None else None
+        return True
+
+    def contains(self, point) -> bool:
+        """ Checks if point is inside of the hull (or on its boundary). """
+        point = (float(point[0]), float(point[1]))
+        for chain, sign in ((self.lower, 1), (self.upper, -1)):
+            successor = chain.lower_bound(point)
+            if successor is not None and successor.key == point:
+                continue
+            predecessor = chain.predecessor(successor) if successor is not None else None
+            if predecessor is None or sign * self.orient(predecessor.key, successor.key, point) < -self.tolerance:
+                return False
+        return True
+
+    def extreme(self, direction) -> np.ndarray:
+        """ Returns vertex of the hull that is the farthest in given direction. """
+        if not self.lower:
+            raise ValueError('Hull is empty')
+        dx, dy = float(direction[0]), float(direction[1])
+
+        # dot product with direction is unimodal along the chain facing that direction
+        chain = self.lower if dy <= 0 else self.upper
+        best, best_value = None, float('-inf')
+        node = chain.root
+        while node is not None:
+            value = dx * node.key[0] + dy * node.key[1]
+            if value > best_value:
+                best, best_value = node.key, value
+            following = node.value
+            if following is not None and dx * following[0] + dy * following[1] > value:
+                node = node.right
+            else:
+                node = node.left
+        return np.array(best)
+
+    def vertices(self) -> np.ndarray:
+        """ Returns vertices of the hull in counter-clockwise order starting from the lowest point (like graham). """
+        lower = list(self.lower)
+        if len(lower) <= 1:
+            return np.array(lower, dtype='d').reshape(-1, 2)
+        hull = np.array(lower + list(self.upper)[-2:0:-1], dtype='d')
+        return np.roll(hull, -lowest_point(hull), axis=0)
@@ -0,0 +1,306 @@
+from typing import Callable, List, Optional
+
+import numpy as np
+
+from src.geometry.triangulation import polygon_triangles
+from src.geometry.utils import orient_predicates, orient_robust_batch
+
+# grid is replaced by slab tree if triangles occupy more cells than this per triangle, or if a cell has more
+# triangles than MAX_BUCKET (long triangles sharing a vertex, like in a fan, fill whole grid)
+GRID_BUDGET = 16
+MAX_BUCKET = 64
+
+
+def _bisect(lo: np.ndarray, hi: np.ndarray, below: Callable[[np.ndarray, np.ndarray], np.ndarray]) -> np.ndarray:
+    """
+    Vectorized binary search, returns for every range [lo, hi) the first index for which below is False
+    (below(rows, indices) is called for rows of ranges still searched and has to be True on prefix of range).
+    """
+    lo, hi = lo.copy(), hi.copy()
+    rows = np.flatnonzero(lo < hi)
+    while len(rows):
+        middle = (lo[rows] + hi[rows]) // 2
+        right = below(rows, middle)
+        lo[rows[right]] = middle[right] + 1
+        hi[rows[~right]] = middle[~right]
+        rows = rows[lo[rows] < hi[rows]]
+    return lo
+
+
+class _SlabTree:
+    """
+    Segment tree over elementary intervals between x coordinates of vertices. Lower and upper boundary edges of
+    triangles are stored in O(log n) nodes covering their x range, and as triangles do not overlap, edges stored
+    in a node (all spanning its whole range) are ordered by y. A query visits nodes from root to its leaf and
+    in each of them binary searches for the highest lower edge below it and the lowest upper edge above it,
+    so it takes time O(log^2 n) in the worst case and the tree takes space O(n log n).
+    """
+
+    def __init__(self, corners: np.ndarray):
+        self.xs = np.unique(corners[:, :, 0])
+        self.height = int(np.ceil(np.log2(max(len(self.xs) - 1, 1))))
+        size = 1 << self.height
+
+        # vertices of every triangle from the left, middle vertex above the longest edge means that it is
+        # the lower boundary, otherwise the two other edges are
+        order = np.lexsort((corners[:, :, 1], corners[:, :, 0]), axis=1)
+        left, middle, right = (np.take_along_axis(corners, order[:, k, None, None], axis=1)[:, 0] for k in range(3))
+        above = orient_robust_batch(left, right, middle) > 0
+        triangles = np.arange(len(corners))
+        self.trees = []
+        for lower in (True, False):
+            single = above == lower
+            begin = np.concatenate((left[single], left[~single], middle[~single]))
+            end = np.concatenate((right[single], middle[~single], right[~single]))
+            owner = np.concatenate((triangles[single], triangles[~single], triangles[~single]))
+            self.trees.append(self._tree(begin, end, owner, size))
+
+        # lowest triangle at every vertex, as points at vertices are not always on edges found by the search
+        vertices, inverse = np.unique(corners.reshape(-1, 2), axis=0, return_inverse=True)
+        self.vertices = vertices
+        self.vertex_triangles = np.full(len(vertices), len(corners), dtype=np.int64)
+        np.minimum.at(self.vertex_triangles, inverse.ravel(), np.repeat(triangles, 3))
+
+    def _tree(self, begin: np.ndarray, end: np.ndarray, owner: np.ndarray, size: int):
+        """
+        Returns edges (begin and end points, triangles) and for every level of tree offsets of its nodes
+        into array of edges sorted by node and y coordinate.
+        """
+        first, last = np.searchsorted(self.xs, begin[:, 0]), np.searchsorted(self.xs, end[:, 0])
+        lo, hi, edges = first + size, last + size, np.arange(len(owner))
+
+        # canonical nodes of intervals of leaves, bottom-up, all nodes found in one step are at the same level
+        levels = []
+        for level in range(self.height, -1, -1):
+            nodes, items = [], []
+            odd = (lo & 1).astype(bool) & (lo < hi)
+            nodes.append(lo[odd])
+            items.append(edges[odd])
+            lo = lo + odd
+            odd = (hi & 1).astype(bool) & (lo < hi)
+            hi = hi - odd
+            nodes.append(hi[odd])
+            items.append(edges[odd])
+            lo, hi = lo >> 1, hi >> 1
+            levels.append((level, np.concatenate(nodes), np.concatenate(items)))
+
+        tree = [None] * (self.height + 1)
+        for level, nodes, items in levels:
+            # edges span whole node, so they are compared at x in the middle of its first leaf
+            leaf = (nodes << (self.height - level)) - size
+            x = (self.xs[leaf] + self.xs[leaf + 1]) / 2
+            a, b = begin[items], end[items]
+            y = a[:, 1] + (b[:, 1] - a[:, 1]) * ((x - a[:, 0]) / (b[:, 0] - a[:, 0]))
+            local = nodes - (1 << level)
+            order = np.lexsort((y, local))
+            tree[level] = items[order], np.concatenate(([0], np.cumsum(np.bincount(local, minlength=1 << level))))
+        return begin, end, owner, tree
+
+    def candidates(self, queries: np.ndarray, orientation: Callable, epsilon: float):
+        """ Returns pairs (query, triangle) of triangles that may contain query points. """
+        found_queries, found_triangles = [], []
+
+        # points at vertices
+        position = np.minimum(np.searchsorted(self._keys(self.vertices), self._keys(queries)), len(self.vertices) - 1)
+        hit = np.flatnonzero(np.all(self.vertices[position] == queries, axis=1))
+        found_queries.append(hit)
+        found_triangles.append(self.vertex_triangles[position[hit]])
+
+        # leaf of every query inside x range of vertices, point at boundary of leaves is searched in both
+        rows = np.flatnonzero((queries[:, 0] >= self.xs[0]) & (queries[:, 0] <= self.xs[-1]))
+        leaf = np.clip(np.searchsorted(self.xs, queries[rows, 0], side='right') - 1, 0, max(len(self.xs) - 2, 0))
+        boundary = (leaf > 0) & (self.xs[leaf] == queries[rows, 0])
+        rows, leaf = np.concatenate((rows, rows[boundary])), np.concatenate((leaf, leaf[boundary] - 1))
+        points = queries[rows]
+
+        for (begin, end, owner, tree), lower in zip(self.trees, (True, False)):
+            for level, (items, offsets) in enumerate(tree):
+                node = leaf >> (self.height - level)
+                lo, hi = offsets[node], offsets[node + 1]
+
+                # lower edges: the last one with point above or on it, upper edges: the first one with point below
+                # or on it (tested edges are ordered, so the test is True on prefix of node)
+                def below(sub, index):
+                    orient = orientation(begin[items[index]], end[items[index]], points[sub])
+                    return orient >= -epsilon if lower else orient > epsilon
+
+                index = _bisect(lo, hi, below) - lower
+                valid = (index >= lo) & (index < hi)
+                found_queries.append(rows[valid])
+                found_triangles.append(owner[items[index[valid]]])
+
+        return np.concatenate(found_queries), np.concatenate(found_triangles)
+
+    @staticmethod
+    def _keys(points: np.ndarray) -> np.ndarray:
+        """ Points as structured array, to search them in lexicographical order. """
+        points = np.ascontiguousarray(points, dtype='d')
+        return points.view([('x', 'd'), ('y', 'd')]).ravel()
+
+
+class PointLocation:
+    """
+    Static index of triangles (for example of triangulation from polygon_triangles or monotone_triangles),
+    answering which triangle contains each of many query points at once.
+
+    Triangles are put into buckets of a uniform grid covering their bounding box, every triangle into all cells
+    overlapping its bounding box. Shape of the grid (number of columns and rows) is chosen so that triangles
+    occupy as few cells as possible, so long and thin triangles of monotone polygons do not fill whole rows.
+    Buckets are kept as a single array with offsets of cells, and queries are processed in rounds, in round k
+    every query that is still not located is tested against k-th triangle of its bucket, all with one
+    vectorized orient per edge.
+
+    Grid takes O(1) time per query for evenly sized triangles, but when many long triangles meet (as in a fan
+    of triangles around a vertex) they fill most cells. If triangles would occupy more than GRID_BUDGET cells
+    per triangle or a cell would hold more than MAX_BUCKET of them, a slab tree is used instead, taking
+    O(log^2 n) time per query in the worst case (it requires that triangles do not overlap).
+    """
+
+    def __init__(self, points: np.ndarray, triangles: Optional[np.ndarray] = None,
+                 epsilon: Optional[float] = 1e-10, cells: Optional[int] = None):
+        """
+        :param points: vertices of triangles (or of simple polygon, if triangles are not given)
+        :param triangles: array of shape (m, 3) with indices of vertices of every triangle (in any orientation),
+            by default polygon given by points is triangulated with polygon_triangles
+        :param epsilon: tolerance of orient, None means exact mode (with robust orient)
+        :param cells: number of grid cells, by default equal to number of triangles
+        """
+        self.points = np.asarray(points, dtype='d').reshape(-1, 2)
+        triangles = polygon_triangles(self.points) if triangles is None else triangles
+        self.triangles = np.array(triangles, dtype=np.int32).reshape(-1, 3)
+        self.epsilon = epsilon
+        self.polygons = np.zeros(len(self.triangles), dtype=np.int32)
+
+        # make all triangles counter-clockwise, so that inside is on the left of every edge
+        a, b, c = (self.points[self.triangles[:, k]] for k in range(3))
+        clockwise = orient_robust_batch(a, b, c) < 0
+        self.triangles[clockwise] = self.triangles[clockwise][:, ::-1]
+        self.corners = self.points[self.triangles]
+
+        self.slabs: Optional[_SlabTree] = None
+        self._build(len(self.triangles) if cells is None else cells)
+
+    @classmethod
+    def from_polygons(cls, polygons: List[np.ndarray], epsilon: Optional[float] = 1e-10,
+                      cells: Optional[int] = None) -> 'PointLocation':
+        """ Creates index of triangulations of given simple polygons, see locate_polygons. """
+        polygons = [np.asarray(polygon, dtype='d').reshape(-1, 2) for polygon in polygons]
+        triangles = [polygon_triangles(polygon) for polygon in polygons]
+        offsets = np.cumsum([0] + [len(polygon) for polygon in polygons])
+        index = cls(np.concatenate(polygons) if polygons else np.empty((0, 2)),
+                    np.concatenate([t + offset for t, offset in zip(triangles, offsets)] + [np.empty((0, 3))]),
+                    epsilon, cells)
+        index.polygons = np.repeat(np.arange(len(polygons), dtype=np.int32), [len(t) for t in triangles])
+        return index
+
+    def __len__(self) -> int:
+        return len(self.triangles)
+
+    def _ranges(self, columns: int, rows: int):
+        """ Returns ranges of columns and rows of cells overlapping bounding boxes of triangles. """
+        scale = self._scale(columns, rows)
+        lo, hi = (self.boxes[0] - self.low) * scale, (self.boxes[1] - self.low) * scale
+        limit = np.array([columns - 1, rows - 1])
+        return np.clip(lo.astype(np.int64), 0, limit), np.clip(hi.astype(np.int64), 0, limit)
+
+    def _scale(self, columns: int, rows: int) -> np.ndarray:
+        """ Returns factors converting coordinates (relative to low corner of grid) to column and row. """
+        return np.array([columns, rows]) / np.maximum(self.high - self.low, np.finfo('d').tiny)
+
+    def _build(self, cells: int):
+        """ Chooses shape of grid with given number of cells and fills its buckets (or builds slab tree). """
+        m = len(self.triangles)
+        self.boxes = self.corners.min(axis=1), self.corners.max(axis=1)
+        if m == 0:
+            self.low = self.high = np.zeros(2)
+        else:
+            self.low, self.high = self.boxes[0].min(axis=0), self.boxes[1].max(axis=0)
+
+        # number of cells occupied by triangles for numbers of columns being powers of two
+        cells = max(1, cells)
+        best = None
+        for columns in (2 ** k for k in range(int(np.log2(cells)) + 1)):
+            rows = max(1, cells // columns)
+            lo, hi = self._ranges(columns, rows)
+            count = int(np.sum(np.prod(hi - lo + 1, axis=1)))
+            if best is None or count < best[0]:
+                best = count, columns, rows
+        count, self.columns, self.rows = best
+        if count > GRID_BUDGET * max(m, cells):
+            self._build_slabs()
+            return
+
+        # cells of every triangle, triangles are listed in increasing order in every bucket
+        lo, hi = self._ranges(self.columns, self.rows)
+        width = hi[:, 0] - lo[:, 0] + 1
+        counts = width * (hi[:, 1] - lo[:, 1] + 1)
+        owner = np.repeat(np.arange(m), counts)
+        offset = np.arange(len(owner)) - np.repeat(np.cumsum(counts) - counts, counts)
+        cell = (lo[owner, 1] + offset // width[owner]) * self.columns + lo[owner, 0] + offset % width[owner]
+
+        order = np.argsort(cell, kind='stable')
+        self.buckets = owner[order].astype(np.int32)
+        self.offsets = np.concatenate(([0], np.cumsum(np.bincount(cell, minlength=self.columns * self.rows))))
+        if np.diff(self.offsets).max(initial=0) > MAX_BUCKET:
+            self._build_slabs()
+
+    def _build_slabs(self):
+        """ Replaces grid with slab tree. """
+        self.columns = self.rows = 1
+        self.buckets = np.empty(0, dtype=np.int32)
+        self.offsets = np.zeros(2, dtype=np.int64)
+        self.slabs = _SlabTree(self.corners)
+
+    def _contains(self, triangles: np.ndarray, points: np.ndarray, orientation: Callable, epsilon: float):
+        """ Tests whether points are inside (or on boundary of) corresponding triangles. """
+        a, b, c = (self.corners[triangles, k] for k in range(3))
+        return (orientation(a, b, points) >= -epsilon) & (orientation(b, c, points) >= -epsilon) \
+            & (orientation(c, a, points) >= -epsilon)
+
+    def locate(self, queries: np.ndarray) -> np.ndarray:
+        """
+        Returns index of triangle containing every query point (-1 if there is none), point on boundary shared
+        by several triangles is assigned to the one with the lowest index.
+        """
+        queries = np.asarray(queries, dtype='d').reshape(-1, 2)
+        result = np.full(len(queries), -1, dtype=np.int32)
+        if len(self.triangles) == 0:
+            return result
+        _, orientation, epsilon = orient_predicates(self.epsilon)
+
+        if self.slabs is not None:
+            # the lowest of candidate triangles containing query point
+            rows, triangles = self.slabs.candidates(queries, orientation, epsilon)
+            found = self._contains(triangles, queries[rows], orientation, epsilon)
+            lowest = np.full(len(queries), len(self.triangles), dtype=np.int64)
+            np.minimum.at(lowest, rows[found], triangles[found])
+            return np.where(lowest < len(self.triangles), lowest, -1).astype(np.int32)
+
+        # bucket of every query inside the grid
+        inside = np.all((queries >= self.low) & (queries <= self.high), axis=1)
+        active = np.flatnonzero(inside)
+        position = ((queries[active] - self.low) * self._scale(self.columns, self.rows)).astype(np.int64)
+        position = np.minimum(position, [self.columns - 1, self.rows - 1])
+        cell = position[:, 1] * self.columns + position[:, 0]
+        begin, end = self.offsets[cell], self.offsets[cell + 1]
+
+        # in every round queries not located yet are tested against next triangle of their buckets
+        keep = begin < end
+        active, begin, end = active[keep], begin[keep], end[keep]
+        while len(active):
+            triangle = self.buckets[begin]
+            found = self._contains(triangle, queries[active], orientation, epsilon)
+            result[active[found]] = triangle[found]
+
+            begin += 1
+            keep = ~found & (begin < end)
+            active, begin, end = active[keep], begin[keep], end[keep]
+
+        return result
+
+    def locate_polygons(self, queries: np.ndarray) -> np.ndarray:
+        """ Returns index of polygon (from from_polygons) containing every query point (-1 if there is none). """
+        triangles = self.locate(queries)
+        if len(self.polygons) == 0:
+            return triangles
+        return np.where(triangles >= 0, self.polygons[triangles], -1)
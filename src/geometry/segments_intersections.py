@@ -1,69 +1,700 @@
-from dataclasses import dataclass, field
-from enum import Enum
-from heapq import heapify, heappop
-from typing import Tuple
+import math
+import os
+from array import array
+from collections import defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import cmp_to_key
+from heapq import heappop, heappush
+from itertools import combinations
+from typing import Tuple, Iterator, List, Set, Optional, Dict, Hashable, Iterable, Union, Any
 
-from sortedcontainers import SortedList
+import numpy as np
 
-from src.geometry import intersection
+from src import instrumentation
+from src.binarytree import AVLTree, Node
+from src.geometry import intersection, intersection_batch
 
 Point = Tuple[float, float]
 Segment = Tuple[Point, Point]
 
 
-class EventType(Enum):
-    """ Defines type of event point. """
-    BEGIN = 0
-    INTERSECTION = 1
-    END = 2
+# types of event points, events are tuples (x, y, type) or (x, y, type, segment) for endpoints of segments,
+# so they are ordered by plain tuple comparison
+BEGIN, INTERSECTION, END = 0, 1, 2
+Event = Tuple[float, ...]
 
 
-@dataclass(order=True)
-class Event:
-    """ Defines event point. """
-    point: Point
-    type: EventType
-    segments: Tuple[Segment, ...] = field(compare=False, default_factory=tuple)
+class SweepLine:
+    """
+    Position of sweep line. Segments in status are compared by their y coordinate at this position,
+    segments that meet at the current event point are compared by slope as they would be just before
+    (or just after) this point.
+    """
+    __slots__ = ('x', 'y', 'after', 'epsilon')
 
+    def __init__(self, epsilon: float):
+        self.x = self.y = float('-inf')
+        self.after = False
+        self.epsilon = epsilon
 
-def bentley_ottmann(segments):
-    """ Bentley-Ottmann algorithm implementation. """
+    def move(self, point: Point, after: bool):
+        self.x, self.y = point
+        self.after = after
 
-    # create queue of events
-    events = SortedList()
-    events.update(Event(min(*seg), EventType.BEGIN, (seg, )) for seg in segments)
-    events.update(Event(max(*seg), EventType.END) for seg in segments)
 
-    # create sweep line status
-    status = SortedList()
+class StatusSegment:
+    """
+    Segment stored in sweep line status, index is its position in input and node is its node in the status tree.
+    Input segment is kept as it was given, so intersections are always computed from the same coordinates.
+    """
+    __slots__ = ('index', 'segment', 'begin', 'end', 'slope', 'scale', 'node')
+
+    def __init__(self, index: int, segment: Segment):
+        self.index = index
+        self.segment = segment
+        self.begin, self.end = sorted(segment)
+        self.node: Optional[Node] = None
+
+        # vertical segments are treated as if they were infinitely steep
+        (x1, y1), (x2, y2) = self.begin, self.end
+        self.slope = (y2 - y1) / (x2 - x1) if x1 != x2 else float('inf')
+
+        # error of y coordinate on the sweep line grows with slope, so tolerance is scaled by it
+        self.scale = max(1.0, abs(self.slope)) if x1 != x2 else 1.0
+
+    def y(self, sweep: SweepLine) -> float:
+        """ Returns y coordinate of segment at given position of sweep line. """
+        x, y = self.begin
+        if self.slope == float('inf'):
+            return min(max(sweep.y, y), self.end[1])
+        if sweep.x == self.end[0]:
+            return self.end[1]
+        return y + (sweep.x - x) * self.slope
+
+
+def compare_segments(first: StatusSegment, second: StatusSegment, sweep: SweepLine) -> int:
+    """ Compares segments by their position on the sweep line. """
+    y1, y2 = first.y(sweep), second.y(sweep)
+    if abs(y1 - y2) > sweep.epsilon * max(first.scale, second.scale):
+        return -1 if y1 < y2 else 1
+
+    # segments that meet at sweep line are ordered by slope, before meeting point steeper one is lower
+    s1, s2 = (first.slope, second.slope) if sweep.after else (-first.slope, -second.slope)
+    if s1 != s2:
+        return -1 if s1 < s2 else 1
+    return (first.index > second.index) - (first.index < second.index)
+
+
+def _intersection(s1: StatusSegment, s2: StatusSegment) -> Optional[Point]:
+    """ Returns intersection point of given segments (or None). """
+    # always compute intersection in the same order (lower index first), so the same pair yields exactly
+    # the same point
+    if s1.index > s2.index:
+        s1, s2 = s2, s1
+    found = intersection(*s1.segment, *s2.segment, restriction_1='segment', restriction_2='segment')
+    if found is not None and math.inf in (s1.slope, s2.slope):
+        # crossing with vertical segment has to be handled while sweep line is at its x coordinate
+        found = (s1.begin[0] if s1.slope == math.inf else s2.begin[0], found[1])
+    return found
+
+
+def _check_intersection(s1: StatusSegment, s2: StatusSegment, point: Point, events: List[Event],
+                        scheduled: List[Event]):
+    """ Schedules intersection event if given (neighbouring) segments intersect after current event point. """
+    found = _intersection(s1, s2)
+    if found is not None and found > point:
+        event = (found[0], found[1], INTERSECTION)
+        heappush(events, event)
+        scheduled.append(event)
+
+
+def _canonical(point: Point, meeting: List[StatusSegment], epsilon: float) -> Point:
+    """
+    Point representing intersection of given segments, which meet at event point. When three or more segments
+    meet, their pairs yield points that differ in last bits, so the event point depends on which pair scheduled
+    it. Instead, the lowest endpoint of segments closer than tolerance to event point is taken, if there is
+    none, intersection of the first pair of segments (ordered by indices) that cross at event point.
+    """
+    endpoints = [end for entry in meeting for end in (entry.begin, entry.end)
+                 if abs(end[0] - point[0]) <= epsilon and abs(end[1] - point[1]) <= epsilon]
+    if endpoints:
+        return min(endpoints)
+    for first, second in combinations(sorted(meeting, key=lambda entry: entry.index), 2):
+        found = _intersection(first, second)
+        if found is not None and abs(found[0] - point[0]) <= epsilon and abs(found[1] - point[1]) <= epsilon:
+            return found
+    return point
+
+
+class _Recent:
+    """
+    Canonical points of intersections reported within tolerance behind the sweep line, an intersection event
+    is not reported again if its canonical point is exactly one of them. Optionally, events closer than given
+    merge distance to one of them are dropped too (points are then hashed into cells of that size).
+    """
+
+    def __init__(self, epsilon: float, merge: float = 0.0):
+        self.window = max(epsilon, merge)
+        self.merge = merge
+        self.cells: Dict[Tuple[float, float], List[Point]] = defaultdict(list)
+        self.points = deque()
+
+    def _cell(self, point: Point) -> Tuple[float, float]:
+        if self.merge == 0:
+            return point
+        return math.floor(point[0] / self.merge), math.floor(point[1] / self.merge)
+
+    def add(self, point: Point) -> bool:
+        """ Adds point and returns True, unless it was already reported (or one closer than merge distance). """
+        while self.points and self.points[0][0] < point[0] - self.window:
+            old = self.points.popleft()
+            self.cells[self._cell(old)].remove(old)
+
+        x, y = self._cell(point)
+        neighbours = ((x, y), ) if self.merge == 0 else \
+            ((x + dx, y + dy) for dx in (-1, 0, 1) for dy in (-1, 0, 1))
+        for cell in neighbours:
+            for other in self.cells.get(cell, ()):
+                if abs(other[0] - point[0]) <= self.merge and abs(other[1] - point[1]) <= self.merge:
+                    return False
+        self.cells[x, y].append(point)
+        self.points.append(point)
+        return True
+
+
+class _Points(set):
+    """ Set of intersection points. """
+
+    def report(self, point: Point, meeting: List[StatusSegment]):
+        self.add(point)
+
+
+class _Count:
+    """ Number of intersection points, nothing is stored for them. """
+    __slots__ = ('count', )
+
+    def __init__(self):
+        self.count = 0
+
+    def __len__(self) -> int:
+        return self.count
+
+    def report(self, point: Point, meeting: List[StatusSegment]):
+        self.count += 1
+
+
+class _Pairs:
+    """ Pairs of intersecting segments (lower index first) and their intersection points, in compact arrays. """
+    __slots__ = ('count', 'pairs', 'points')
+
+    def __init__(self):
+        self.count = 0
+        self.pairs = array('q')
+        self.points = array('d')
+
+    def __len__(self) -> int:
+        return self.count
+
+    def report(self, point: Point, meeting: List[StatusSegment]):
+        self.count += 1
+        for pair in combinations(sorted(entry.index for entry in meeting), 2):
+            self.pairs.extend(pair)
+            self.points.extend(point)
+
+    def arrays(self) -> Tuple[np.ndarray, np.ndarray]:
+        return _sorted_pairs(np.frombuffer(self.pairs, dtype=np.int64).reshape(-1, 2),
+                             np.frombuffer(self.points).reshape(-1, 2))
+
+
+def _sorted_pairs(pairs: np.ndarray, points: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """ Sorts pairs by their intersection points (and indices), so the order does not depend on the engine. """
+    order = np.lexsort((pairs[:, 1], pairs[:, 0], points[:, 1], points[:, 0]))
+    return pairs[order], points[order]
+
+
+OUTPUTS = {'points': _Points, 'count': _Count, 'pairs': _Pairs}
+
+
+def _reorder(status: AVLTree, nodes: List[Node], entries: List[StatusSegment]):
+    """ Puts given entries into given (neighbouring) nodes of status, by swapping them in place. """
+    for node, entry in zip(nodes, entries):
+        if entry.node is not node:
+            other, current = node.key, entry.node
+            status.swap(node, current)
+            entry.node, other.node = node, current
+
+
+def bentley_ottmann_steps(segments, epsilon: Optional[float] = 1e-10
+                          ) -> Iterator[Tuple[Point, AVLTree, List[Event], Set[Point], List[Event]]]:
+    """
+    Bentley-Ottmann sweep in form of a generator, yields after every handled event point
+    (event point, status, queue of intersection events, intersections found so far and events scheduled
+    in this step). Status is a balanced tree ordered by position of segments on the sweep line and only
+    neighbouring segments are tested for intersections, so it runs in time O((n + k) log n) where k is
+    number of intersections. With epsilon set to None tolerance is chosen relative to magnitude of coordinates.
+    """
+    segments = np.asarray(segments, dtype='d').reshape(-1, 2, 2)
+    if epsilon is None:
+        epsilon = relative_epsilon(segments)
+    return _sweep(segments, np.arange(len(segments)), epsilon)
+
+
+def _endpoint_events(segments: np.ndarray, start: float, chunk_size: int = 2 ** 16) -> Iterator[Event]:
+    """
+    Yields events (x, y, type, segment) of endpoints with x coordinate not smaller than start, in order.
+    Events are sorted at once in arrays and turned into tuples in chunks, so there are never many of them.
+    """
+    swap = (segments[:, 0, 0] > segments[:, 1, 0]) \
+        | ((segments[:, 0, 0] == segments[:, 1, 0]) & (segments[:, 0, 1] > segments[:, 1, 1]))
+    points = np.concatenate((np.where(swap[:, None], segments[:, 1], segments[:, 0]),
+                             np.where(swap[:, None], segments[:, 0], segments[:, 1])))
+    types = np.repeat(np.array([BEGIN, END], dtype=np.int8), len(segments))
+    ids = np.tile(np.arange(len(segments)), 2)
+
+    keep = points[:, 0] >= start
+    points, types, ids = points[keep], types[keep], ids[keep]
+    with instrumentation.phase('sort'):
+        order = np.lexsort((ids, types, points[:, 1], points[:, 0]))
+    for i in range(0, len(order), chunk_size):
+        chunk = order[i:i + chunk_size]
+        yield from zip(points[chunk, 0].tolist(), points[chunk, 1].tolist(), types[chunk].tolist(),
+                       ids[chunk].tolist())
+
+
+def _sweep(segments: np.ndarray, indices: np.ndarray, epsilon: float, start: float = -math.inf,
+           stop: float = math.inf, result=None, merge: float = 0.0
+           ) -> Iterator[Tuple[Point, AVLTree, List[Event], Any, List[Event]]]:
+    """
+    Sweep reporting only intersections with x coordinate in range [start, stop), segments (array of shape
+    (n, 2, 2)) are given together with their indices in the whole input. Segments crossing the line at start
+    (less tolerance) are put into status at once, in the order they would have there in sweep over the whole
+    input, so the slab is processed exactly as in that sweep, without clipping segments (and changing their
+    coordinates). Segments are kept only in the array until they are reached by the sweep line.
+
+    Intersections are reported to result (one of OUTPUTS, by default set of points). Every event point is
+    handled once (all events at exactly the same point are handled together) and reported as its canonical
+    point, unless the same canonical point was already reported (or one closer than merge distance, if given),
+    so there are no duplicates.
+    Events within tolerance from both ends of the range are handled too (but not reported), so that
+    neighbouring slabs agree on which intersections are duplicates.
+    """
+
+    # create sweep line and its status
+    sweep = SweepLine(epsilon)
+    status = AVLTree(compare_segments, sweep)
+    order = cmp_to_key(lambda a, b: compare_segments(a, b, sweep))
+
+    def activate(i: int) -> StatusSegment:
+        return StatusSegment(int(indices[i]), tuple(map(tuple, segments[i].tolist())))
+
+    # endpoints are taken from sorted stream, only intersection events are kept in the heap
+    first, last = start - epsilon, stop + epsilon
+    endpoints = _endpoint_events(segments, first)
+    pending = next(endpoints, None)
+    events: List[Event] = []
+
+    # segments crossing the first line, just before it
+    scheduled = []
+    if first > -math.inf:
+        point = (first, -math.inf)
+        sweep.move(point, after=False)
+        lo, hi = segments[:, :, 0].min(axis=1), segments[:, :, 0].max(axis=1)
+        for crossing in sorted(map(activate, np.flatnonzero((lo < first) & (first <= hi))), key=order):
+            crossing.node = status.insert(crossing)
+        for node in status.nodes():
+            above = status.successor(node)
+            if above is not None:
+                _check_intersection(node.key, above.key, point, events, scheduled)
 
     # intersections points
-    result = set()
+    result = _Points() if result is None else result
+    recent = _Recent(epsilon, merge)
+
+    # vertical segments are not kept in status, but in list of segments at the current x coordinate
+    # (all of them contain current event point, as events are ordered by y coordinate at the same x)
+    verticals = []
 
     # while there are events to handle
-    while events:
+    while pending is not None or events:
+        point = events[0][:2] if pending is None or (events and events[0] < pending) else pending[:2]
+        if point[0] >= last:
+            break
+
+        # collect segments starting at the same event point (duplicated intersection events are dropped)
+        starting, vertical = [], []
+        while pending is not None and pending[0] == point[0] and pending[1] == point[1]:
+            if pending[2] == BEGIN:
+                new = activate(pending[3])
+                (vertical if new.slope == math.inf else starting).append(new)
+            pending = next(endpoints, None)
+        while events and events[0][0] == point[0] and events[0][1] == point[1]:
+            heappop(events)
+        verticals += vertical
+
+        # find segments that contain event point, just before the sweep line reaches it,
+        # together with their neighbours below and above
+        sweep.move(point, after=False)
+        above = status.lower_bound(StatusSegment(-1, (point, point)))
+        below = status.predecessor(above) if above is not None else status.last()
+        containing = []
+        while below is not None and abs(below.key.y(sweep) - point[1]) <= epsilon * below.key.scale:
+            containing.append(below)
+            below = status.predecessor(below)
+        containing.reverse()
+        while above is not None and abs(above.key.y(sweep) - point[1]) <= epsilon * above.key.scale:
+            containing.append(above)
+            above = status.successor(above)
+
+        # report intersection if at least two segments meet at event point
+        if len(containing) + len(starting) + len(verticals) > 1:
+            meeting = [node.key for node in containing] + starting + verticals
+            canonical = _canonical(point, meeting, epsilon)
+            if recent.add(canonical) and start <= canonical[0] < stop:
+                result.report(canonical, meeting)
+
+        # remove segments ending at event point, the ones that continue after it swap places in their nodes
+        # (as they are now compared just after the event point), new segments are inserted
+        sweep.move(point, after=True)
+        continuing = [node for node in containing if node.key.end != point]
+        for node in containing:
+            if node.key.end == point:
+                status.remove(node)
+                node.key.node = None
+        _reorder(status, continuing, sorted((node.key for node in continuing), key=order))
+        for entry in starting:
+            entry.node = status.insert(entry)
+
+        # check new neighbours for intersections
+        scheduled = []
+        if not continuing and not starting:
+            if below is not None and above is not None:
+                _check_intersection(below.key, above.key, point, events, scheduled)
+        else:
+            inserted = sorted([node.key for node in continuing] + starting, key=order)
+            below, above = status.predecessor(inserted[0].node), status.successor(inserted[-1].node)
+            if below is not None:
+                _check_intersection(below.key, inserted[0], point, events, scheduled)
+            if above is not None:
+                _check_intersection(inserted[-1], above.key, point, events, scheduled)
+
+        # new vertical segments cross all segments of status in their range
+        for entry in vertical:
+            node = status.lower_bound(StatusSegment(-1, (point, point)))
+            while node is not None and node.key.y(sweep) <= entry.end[1] + epsilon * node.key.scale:
+                _check_intersection(entry, node.key, point, events, scheduled)
+                node = status.successor(node)
+        verticals = [entry for entry in verticals if entry.end != point]
 
-        event = events.pop(0)
+        yield point, status, events, result, scheduled
 
-        if event.type == EventType.BEGIN:
-            for seg1 in event.segments:
-                for seg2 in status:
-                    point = intersection(*seg1, *seg2, restriction_1='segment', restriction_2='segment')
-                    if point is None:
-                        continue
-                    point = (round(point[0], 15), round(point[1], 15))
-                    if point not in result:
-                        result.add(point)
-                        events.add(Event(point, EventType.INTERSECTION))
 
-            for seg in event.segments:
-                status.add(seg)
+def relative_epsilon(segments: np.ndarray) -> float:
+    """
+    Tolerance for comparing positions of segments on the sweep line. Intersection points are rounded,
+    so they are not exactly on their segments, but their errors are proportional to magnitude of coordinates.
+    """
+    return float(np.abs(segments).max(initial=0.0)) * 2.0 ** -40
 
-        elif event.type == EventType.END:
-            for seg in event.segments:
-                status.remove(seg)
 
-        elif event.type == EventType.INTERSECTION:
+def _intersections(segments: np.ndarray, indices: np.ndarray, epsilon: float, output: str,
+                   start: float = -math.inf, stop: float = math.inf, merge: float = 0.0):
+    """ Runs sweep (over given slab) and returns its result in given form. """
+    if output not in OUTPUTS:
+        raise ValueError(f'Unknown output: {output}')
+    result = OUTPUTS[output]()
+    steps = _sweep(segments, indices, epsilon, start, stop, result, merge)
+
+    # events and size of status are counted by a separate loop, so there is no cost when instrumentation is off
+    stats = instrumentation.active()
+    if stats is None:
+        for _ in steps:
             pass
+    else:
+        with stats.phase('sweep'):
+            for _, status, _, _, _ in steps:
+                stats.count('events')
+                stats.maximum('max status size', len(status))
+    if output == 'count':
+        return len(result)
+    return result.arrays() if output == 'pairs' else result
+
+
+def bentley_ottmann(segments, epsilon: Optional[float] = 1e-10, output: str = 'points', merge: float = 0.0
+                    ) -> Union[Set[Point], int, Tuple[np.ndarray, np.ndarray]]:
+    """
+    Bentley-Ottmann algorithm implementation.
+
+    :param segments: segments given as pairs of points
+    :param epsilon: tolerance (None to choose it relative to magnitude of coordinates)
+    :param output: form of result:
+        - 'points' - set of intersection points
+        - 'count' - number of intersection points (nothing is stored for them)
+        - 'pairs' - array of shape (k, 2) with pairs of indices of intersecting segments (lower index first)
+          and array of shape (k, 2) with their intersection points, sorted by points (pair of overlapping
+          segments is reported at both ends of the overlap)
+    :param merge: intersections closer than this distance to an already reported one are merged into it,
+        by default only intersections with exactly the same canonical point are
+    :return: intersections in given form
+    """
+    segments = np.asarray(segments, dtype='d').reshape(-1, 2, 2)
+    if epsilon is None:
+        epsilon = relative_epsilon(segments)
+    return _intersections(segments, np.arange(len(segments)), epsilon, output, merge=merge)
+
+
+def slab_bounds(segments: np.ndarray, slabs: int) -> np.ndarray:
+    """
+    Boundaries between vertical slabs (without the outer ones, which are infinite), chosen so that every slab
+    contains about the same number of segment endpoints. Boundaries lie in the middle between x coordinates
+    of endpoints, so that there are no endpoints close to them.
+    """
+    xs, counts = np.unique(np.asarray(segments, dtype='d').reshape(-1, 2, 2)[:, :, 0], return_counts=True)
+    positions = np.searchsorted(np.cumsum(counts), (np.arange(1, slabs) * counts.sum()) // slabs, side='right')
+    positions = np.unique(positions[(positions > 0) & (positions < len(xs))])
+    return (xs[positions - 1] + xs[positions]) / 2
+
+
+def parallel_bentley_ottmann(segments, epsilon: Optional[float] = 1e-10, output: str = 'points',
+                             workers: Optional[int] = None, slabs: Optional[int] = None,
+                             min_parallel: int = 10 ** 4, merge: float = 0.0) -> Union[Set[Point], int, Tuple[np.ndarray, np.ndarray]]:
+    """
+    Bentley-Ottmann algorithm run in parallel over vertical slabs with the same number of segment endpoints.
+    Every slab is swept in a separate process, from the order of segments crossing its left boundary,
+    and reports only intersections with x coordinate inside it, so every intersection is reported once
+    (by slab owning it) and result is the same as the one of bentley_ottmann (with merge distance given,
+    intersections closer than it are merged only inside slabs).
+    Inputs smaller than min_parallel (or single worker) are processed serially.
+
+    :param segments: segments given as pairs of points
+    :param epsilon: tolerance (None to choose it relative to magnitude of coordinates)
+    :param output: form of result, as in bentley_ottmann
+    :param workers: number of worker processes, None uses all processors
+    :param slabs: number of slabs, by default equal to number of workers
+    :param min_parallel: minimal number of segments to start worker processes for
+    :param merge: distance of merged intersections, as in bentley_ottmann
+    :return: intersections in given form
+    """
+    workers = os.cpu_count() if workers is None else workers
+    segments = np.asarray(segments, dtype='d').reshape(-1, 2, 2)
+    if workers <= 1 or len(segments) < min_parallel:
+        return bentley_ottmann(segments, epsilon, output, merge)
+    if output not in OUTPUTS:
+        raise ValueError(f'Unknown output: {output}')
+
+    # tolerance has to be the same in all slabs
+    if epsilon is None:
+        epsilon = relative_epsilon(segments)
+
+    # every slab gets segments overlapping it (together with their indices, used to order computations)
+    lo, hi = segments[:, :, 0].min(axis=1), segments[:, :, 0].max(axis=1)
+    bounds = np.concatenate(([-math.inf], slab_bounds(segments, slabs or workers), [math.inf]))
+    tasks = []
+    for start, stop in zip(bounds[:-1].tolist(), bounds[1:].tolist()):
+        indices = np.flatnonzero((lo < stop + epsilon) & (hi >= start - epsilon))
+        tasks.append((segments[indices], indices, epsilon, output, start, stop, merge))
+
+    with ProcessPoolExecutor(workers) as pool:
+        results = [future.result() for future in [pool.submit(_intersections, *task) for task in tasks]]
+    if output == 'count':
+        return sum(results)
+    if output == 'pairs':
+        return _sorted_pairs(*map(np.concatenate, zip(*results)))
+    return set().union(*results)
+
+
+def auto_cell_size(segments: np.ndarray) -> float:
+    """
+    Heuristic cell size for grid_intersections: cells should be about as big as a typical segment
+    (so most segments fall into a few cells), but there should not be many more cells than segments.
+    """
+    segments = np.asarray(segments, dtype='d').reshape(-1, 2, 2)
+    lo, hi = segments.min(axis=1), segments.max(axis=1)
+    extent = hi.max(axis=0) - lo.min(axis=0)
+
+    typical = np.median(np.max(hi - lo, axis=1)) if len(segments) else 0.0
+    size = max(typical, np.sqrt(extent[0] * extent[1] / max(len(segments), 1)), extent.max() / 2 ** 20)
+    return float(size) if size > 0 else 1.0
+
+
+def grid_intersections(segments: np.ndarray, cell_size: Optional[float] = None,
+                       max_pairs: int = 2 ** 22) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Finds all pairs of intersecting segments using uniform grid as a broad phase.
+    Bounding boxes of segments are binned into square cells, segments sharing a cell become candidate pairs
+    (every pair is considered only in the cell containing lower left corner of common part of their
+    bounding boxes, so there are no duplicates) and all candidates are tested at once with NumPy.
+    Candidates are generated in batches of about max_pairs pairs to limit memory usage.
+
+    :param segments: array of shape (n, 2, 2)
+    :param cell_size: size of grid cell, by default chosen with auto_cell_size
+    :param max_pairs: approximate number of candidate pairs tested at once
+    :return: array of shape (k, 2) with pairs of indices (lower index first) and array of shape (k, 2) with points
+    """
+    segments = np.asarray(segments, dtype='d').reshape(-1, 2, 2)
+    if cell_size is None:
+        cell_size = auto_cell_size(segments)
+
+    # cell ranges covered by bounding boxes of segments
+    lo, hi = segments.min(axis=1), segments.max(axis=1)
+    origin = lo.min(axis=0) if len(segments) else np.zeros(2)
+    first_cell = np.floor((lo - origin) / cell_size).astype(np.int64)
+    last_cell = np.floor((hi - origin) / cell_size).astype(np.int64)
+    columns = int(last_cell[:, 0].max(initial=0)) + 1
+
+    # expand every segment into (segment, cell) entries
+    width = last_cell[:, 0] - first_cell[:, 0] + 1
+    counts = width * (last_cell[:, 1] - first_cell[:, 1] + 1)
+    owner = np.repeat(np.arange(len(segments)), counts)
+    local = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    cells = (first_cell[owner, 1] + local // width[owner]) * columns + first_cell[owner, 0] + local % width[owner]
+
+    # sort entries by cell, for every entry find end of its cell
+    order = np.argsort(cells, kind='stable')
+    owner, cells = owner[order], cells[order]
+    boundaries = np.flatnonzero(np.diff(cells)) + 1
+    ends = np.repeat(np.append(boundaries, len(cells)), np.diff(np.concatenate(([0], boundaries, [len(cells)]))))
+
+    # every entry is paired with following entries in the same cell
+    partners = ends - np.arange(len(cells)) - 1
+    cumulative = np.cumsum(partners)
+
+    pairs, points = [], []
+    start = 0
+    while start < len(cells):
+        # take as many entries as possible without exceeding max_pairs pairs
+        done = cumulative[start - 1] if start else 0
+        stop = max(int(np.searchsorted(cumulative, done + max_pairs, side='right')), start + 1)
+        count = partners[start:stop]
+        i = np.repeat(np.arange(start, stop), count)
+        j = i + 1 + np.arange(count.sum()) - np.repeat(np.cumsum(count) - count, count)
+        start = stop
+
+        # keep pairs with overlapping bounding boxes, in the cell owning corner of the overlap
+        i, j, cell = owner[i], owner[j], cells[i]
+        corner = np.maximum(lo[i], lo[j])
+        overlap = np.all(corner <= np.minimum(hi[i], hi[j]), axis=1)
+        corner_cell = np.floor((corner - origin) / cell_size).astype(np.int64)
+        keep = overlap & (corner_cell[:, 1] * columns + corner_cell[:, 0] == cell)
+        i, j = np.minimum(i[keep], j[keep]), np.maximum(i[keep], j[keep])
+
+        # narrow phase
+        found, valid, _, _ = intersection_batch(segments[i], segments[j], 'segment', 'segment')
+        pairs.append(np.stack((i[valid], j[valid]), axis=1))
+        points.append(found[valid])
+
+    pairs = np.concatenate(pairs) if pairs else np.empty((0, 2), dtype=np.int64)
+    points = np.concatenate(points) if points else np.empty((0, 2))
+    order = np.lexsort((pairs[:, 1], pairs[:, 0]))
+    return pairs[order], points[order]
+
+
+class SegmentIndex:
+    """
+    Dynamic index of segments (identified by any hashable ids), answering which stored segments are crossed
+    by a given one. Segments are kept in a hierarchy of uniform grids (cells at level L are 2^L times bigger
+    than at level 0), every segment is stored at the lowest level where its bounding box covers at most
+    2 x 2 cells. So, like in R-tree, big segments do not fill many small cells, while insertion and removal
+    take constant time. Candidates found in cells overlapping bounding box of a query are tested with
+    intersection_batch.
+    """
+
+    def __init__(self, cell_size: float = 1.0):
+        self.cell_size = float(cell_size)
+        self.segments: Dict[Hashable, Segment] = {}
+        self.grids: Dict[int, Dict[Tuple[int, int], Set[Hashable]]] = defaultdict(lambda: defaultdict(set))
+        self.placement: Dict[Hashable, Tuple[int, List[Tuple[int, int]]]] = {}
+
+    @classmethod
+    def from_segments(cls, segments: np.ndarray, ids: Optional[Iterable[Hashable]] = None,
+                      cell_size: Optional[float] = None) -> 'SegmentIndex':
+        """ Creates index with given segments (by default identified by their positions) and fitting cell size. """
+        segments = np.asarray(segments, dtype='d').reshape(-1, 2, 2)
+        index = cls(auto_cell_size(segments) if cell_size is None else cell_size)
+        for i, segment in zip(range(len(segments)) if ids is None else ids, segments.tolist()):
+            index.insert(i, segment)
+        return index
+
+    def __len__(self) -> int:
+        return len(self.segments)
+
+    def __contains__(self, segment_id: Hashable) -> bool:
+        return segment_id in self.segments
+
+    def __getitem__(self, segment_id: Hashable) -> Segment:
+        return self.segments[segment_id]
+
+    def _level(self, lo: Tuple[float, float], hi: Tuple[float, float]) -> int:
+        extent = max(hi[0] - lo[0], hi[1] - lo[1])
+        return max(0, math.ceil(math.log2(extent / self.cell_size))) if extent > 0 else 0
+
+    def _cells(self, level: int, lo: Tuple[float, float], hi: Tuple[float, float]) -> Iterator[Tuple[int, int]]:
+        size = self.cell_size * 2 ** level
+        x0, y0, x1, y1 = (math.floor(c / size) for c in (lo[0], lo[1], hi[0], hi[1]))
+        return ((x, y) for x in range(x0, x1 + 1) for y in range(y0, y1 + 1))
+
+    def insert(self, segment_id: Hashable, segment):
+        """ Inserts segment with given id (replacing segment stored with this id before). """
+        if segment_id in self.segments:
+            self.remove(segment_id)
+
+        segment = tuple(tuple(map(float, p)) for p in segment)
+        lo, hi = tuple(map(min, *segment)), tuple(map(max, *segment))
+        level = self._level(lo, hi)
+        cells = list(self._cells(level, lo, hi))
+        grid = self.grids[level]
+        for cell in cells:
+            grid[cell].add(segment_id)
+
+        self.segments[segment_id] = segment
+        self.placement[segment_id] = level, cells
+
+    def remove(self, segment_id: Hashable):
+        """ Removes segment with given id, raises KeyError if there is no such segment. """
+        del self.segments[segment_id]
+        level, cells = self.placement.pop(segment_id)
+        grid = self.grids[level]
+        for cell in cells:
+            grid[cell].discard(segment_id)
+            if not grid[cell]:
+                del grid[cell]
+        if not grid:
+            del self.grids[level]
+
+    def candidates(self, segment) -> Set[Hashable]:
+        """ Returns ids of segments that are stored in cells overlapping bounding box of given segment. """
+        lo, hi = tuple(map(min, *segment)), tuple(map(max, *segment))
+        result = set()
+        for level, grid in self.grids.items():
+            size = self.cell_size * 2 ** level
+            count = (math.floor(hi[0] / size) - math.floor(lo[0] / size) + 1) \
+                * (math.floor(hi[1] / size) - math.floor(lo[1] / size) + 1)
+
+            # for big queries it is faster to go through occupied cells
+            if count <= len(grid):
+                for cell in self._cells(level, lo, hi):
+                    result.update(grid.get(cell, ()))
+            else:
+                x0, y0, x1, y1 = (math.floor(c / size) for c in (lo[0], lo[1], hi[0], hi[1]))
+                for (x, y), ids in grid.items():
+                    if x0 <= x <= x1 and y0 <= y <= y1:
+                        result.update(ids)
+        return result
+
+    def query(self, segment) -> List[Tuple[Hashable, Optional[Point]]]:
+        """
+        Returns ids of stored segments crossed by given segment, together with their intersection points
+        (None for co-linear segments that overlap).
+        """
+        segment = tuple(tuple(map(float, p)) for p in segment)
+        ids = list(self.candidates(segment))
+        if not ids:
+            return []
+
+        stored = np.array([self.segments[i] for i in ids])
+        points, valid, _, overlap = intersection_batch(np.broadcast_to(segment, stored.shape), stored,
+                                                       'segment', 'segment')
+        return [(i, tuple(point) if single else None)
+                for i, point, single, both in zip(ids, points.tolist(), valid, overlap) if single or both]
+
 
-    return result
+instrumentation.count_calls(__name__, ('_intersection', ), 'intersection tests')
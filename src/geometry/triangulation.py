@@ -1,6 +1,12 @@
+import math
 from collections import defaultdict
+from typing import List
 
+import numpy as np
+from src import instrumentation
+from src.binarytree import AVLTree
 from src.geometry import orient
+from src.geometry.utils import orient_batch, orient_robust, orient_robust_batch
 
 
 def to_polygon(lines):
@@ -23,9 +29,27 @@ def classify_vertex(a, b, c):
 
 def classify_poly(points):
     classes = defaultdict(list)
+    if len(points) == 0:
+        return classes
 
-    for i in range(len(points)):
-        classes[classify_vertex(points[i - 2], points[i - 1], points[i])].append((i - 1 + len(points)) % len(points))
+    # previous, current and next vertex for every vertex of polygon
+    b = np.asarray(points, dtype='d')
+    a = np.roll(b, 1, axis=0)
+    c = np.roll(b, -1, axis=0)
+
+    # same rules as in classify_vertex, evaluated for all vertices at once
+    convex = orient_batch(a, b, c) > 0
+    above = (a[:, 1] < b[:, 1]) & (c[:, 1] < b[:, 1])
+    below = (a[:, 1] > b[:, 1]) & (c[:, 1] > b[:, 1])
+    names = np.full(len(b), 'correct', dtype=object)
+    names[above & convex] = 'begin'
+    names[above & ~convex] = 'split'
+    names[below & convex] = 'end'
+    names[below & ~convex] = 'connect'
+
+    # keep order in which classify_vertex loop used to visit vertices
+    for i in np.roll(np.arange(len(b)), 1):
+        classes[names[i]].append(int(i))
 
     return classes
 
@@ -49,14 +73,30 @@ def poly_to_two_chains(poly):
     return left, right
 
 
-def triangulate_monotonic(poly):
+def triangulate_monotonic(poly, output: str = 'diagonals'):
+    """
+    Triangulates y-monotone polygon.
+
+    :param poly: vertices of polygon (counter-clockwise)
+    :param output: form of result:
+        - 'diagonals' - list of diagonals (as pairs of points, edges of polygon can be repeated among them)
+        - 'triangles' - array of shape (n-2, 3) with indices of vertices of every triangle, from monotone_triangles
+        - 'mesh' - HalfEdgeMesh of triangles from monotone_triangles
+    """
+    if output == 'triangles':
+        return monotone_triangles(poly)
+    if output == 'mesh':
+        return HalfEdgeMesh(poly, monotone_triangles(poly))
+    if output != 'diagonals':
+        raise ValueError(f'Unknown output: {output}')
 
     # get two chains
     left, right = poly_to_two_chains(poly)
 
     # sort chains
-    left = sorted(left, key=lambda p: p[1], reverse=True)
-    right = sorted(right, key=lambda p: p[1], reverse=True)
+    with instrumentation.phase('sort'):
+        left = sorted(left, key=lambda p: p[1], reverse=True)
+        right = sorted(right, key=lambda p: p[1], reverse=True)
 
     # result
     result = []
@@ -67,49 +107,411 @@ def triangulate_monotonic(poly):
     # for each event
     il = 1
     ir = 0
-    while il < len(left) - 1 or ir < len(right) - 1:
+    with instrumentation.phase('scan'):
+        while il < len(left) - 1 or ir < len(right) - 1:
+
+            # select side and get event
+            if left[il][1] > right[ir][1]:
+                side = 'left'
+                e = left[il]
+                il += 1
+            else:
+                side = 'right'
+                e = right[ir]
+                ir += 1
+
+            # holds list of vertices that block other vertices
+            blocking = []
+
+            # get previous on this side
+            if side == 'left':
+                prev = left[il-2] if il > 1 else left[0]
+            else:
+                prev = right[ir-2] if ir > 1 else left[0]
+
+            # for each visible point
+            for v in visible:
+
+                if v != prev:
+                    if side == 'left' and orient(e, prev, v) > 0:
+                        continue
+                    if side == 'right' and orient(e, prev, v) < 0:
+                        continue
+
+                result.append((v, e))
+
+                # if its a line from left to right it blocks
+                if (v in left and e in right) or (v in right and e in left):
+                    blocking.append(v)
+
+            # update visible vertices
+            if blocking:
+                visible = [min(blocking, key=lambda x: x[1])]
+            visible.append(e)
+
+        # add end vertex
+        for v in visible:
+            result.append((v, left[-1]))
+
+    # every vertex but the top and the bottom one is an event
+    stats = instrumentation.active()
+    if stats is not None:
+        stats.count('events', len(left) + len(right) - 3)
+
+    return result
+
+
+def _above(points, i, j):
+    """ Checks if vertex i is above vertex j (higher, or on the same height and more to the left). """
+    return points[i][1] > points[j][1] or (points[i][1] == points[j][1] and points[i][0] < points[j][0])
 
-        # select side and get event
-        if left[il][1] > right[ir][1]:
-            side = 'left'
-            e = left[il]
+
+def monotone_triangles(points) -> np.ndarray:
+    """
+    Triangulates y-monotone polygon (given counter-clockwise) in time O(n) and returns array of shape (n-2, 3)
+    with indices of vertices of every triangle (in counter-clockwise order).
+    Both chains are already sorted, so they are merged instead of sorting and membership of vertex in chain
+    is kept as a flag, so there are no list scans.
+    """
+    points = np.asarray(points, dtype='d')
+    n = len(points)
+    if n < 3:
+        return np.empty((0, 3), dtype=np.int32)
+    coords = points.tolist()
+
+    # find top and bottom vertex
+    top = bottom = 0
+    for i in range(1, n):
+        if _above(coords, i, top):
+            top = i
+        if _above(coords, bottom, i):
+            bottom = i
+
+    # going counter-clockwise from top leads down the left chain, going clockwise leads down the right chain
+    left = [(top + k) % n for k in range(1, (bottom - top) % n)]
+    right = [(top - k) % n for k in range(1, (top - bottom) % n)]
+    on_left = np.zeros(n, dtype=bool)
+    on_left[left] = True
+
+    # merge chains into single sequence sorted from top to bottom
+    order = [top]
+    il = ir = 0
+    while il < len(left) or ir < len(right):
+        if ir == len(right) or (il < len(left) and _above(coords, left[il], right[ir])):
+            order.append(left[il])
             il += 1
         else:
-            side = 'right'
-            e = right[ir]
+            order.append(right[ir])
             ir += 1
+    order.append(bottom)
+
+    # stack of vertices that still may need diagonals (all but the first one are reflex)
+    triangles = []
+    stack = [order[0], order[1]]
+    with instrumentation.phase('scan'):
+        for u in order[2:-1]:
+
+            # vertex on other chain than top of stack sees all vertices on stack
+            if on_left[u] != on_left[stack[-1]]:
+                last = stack[-1]
+                while len(stack) > 1:
+                    triangles.append((u, stack.pop(), stack[-1]))
+                stack = [last, u]
+
+            # vertex on the same chain sees vertices on stack until first reflex one
+            else:
+                last = stack.pop()
+                sign = 1 if on_left[u] else -1
+                while stack and sign * orient_robust(coords[stack[-1]], coords[last], coords[u]) > 0:
+                    triangles.append((u, last, stack[-1]))
+                    last = stack.pop()
+                stack.append(last)
+                stack.append(u)
+
+        # bottom vertex sees all vertices left on stack
+        u = order[-1]
+        while len(stack) > 1:
+            triangles.append((u, stack.pop(), stack[-1]))
+
+    # make all triangles counter-clockwise
+    triangles = np.array(triangles, dtype=np.int32).reshape(-1, 3)
+    clockwise = orient_robust_batch(points[triangles[:, 0]], points[triangles[:, 1]], points[triangles[:, 2]]) < 0
+    triangles[clockwise] = triangles[clockwise][:, ::-1]
+    return triangles
+
+
+def triangulate_monotonic_linear(poly):
+    """
+    Triangulates y-monotone polygon in time O(n) with the classic reflex vertex stack,
+    returns list of diagonals (as pairs of points) like triangulate_monotonic.
+    """
+    triangles = monotone_triangles(poly)
+
+    # edges of triangles that are not edges of polygon
+    n = len(poly)
+    edges = np.concatenate((triangles[:, [0, 1]], triangles[:, [1, 2]], triangles[:, [2, 0]]))
+    diagonals = edges[(edges[:, 0] - edges[:, 1]) % n != 1]
+    diagonals = diagonals[(diagonals[:, 1] - diagonals[:, 0]) % n != 1]
+    diagonals = np.unique(np.sort(diagonals, axis=1), axis=0)
+
+    return [(poly[a], poly[b]) for a, b in diagonals.tolist()]
+
+
+class _SweepEdge:
+    """
+    Edge of polygon stored in status of monotone decomposition sweep, ordered by x coordinate at current
+    height of the sweep line (and by direction, as just below the sweep line, if they meet there).
+    """
+    __slots__ = ('index', 'upper', 'lower', 'slope', 'node')
+
+    def __init__(self, index, upper, lower):
+        self.index = index
+        self.upper, self.lower = upper, lower
+        self.node = None
+
+        # change of x per unit of height, horizontal edges are treated as infinitely flat
+        (x1, y1), (x2, y2) = upper, lower
+        self.slope = (x2 - x1) / (y1 - y2) if y1 != y2 else float('inf')
+
+    def x(self, sweep):
+        """ Returns x coordinate of edge at given position of sweep line. """
+        (x1, y1), (x2, y2) = self.upper, self.lower
+        if y1 == y2:
+            return min(max(sweep[0], min(x1, x2)), max(x1, x2))
+        if sweep[1] == y2:
+            return x2
+        return x1 + (y1 - sweep[1]) * self.slope
 
-        # holds list of vertices that block other vertices
-        blocking = []
 
-        # get previous on this side
-        if side == 'left':
-            prev = left[il-2] if il > 1 else left[0]
+def _compare_edges(first, second, sweep):
+    x1, x2 = first.x(sweep), second.x(sweep)
+    if x1 != x2:
+        return -1 if x1 < x2 else 1
+    if first.slope != second.slope:
+        return -1 if first.slope < second.slope else 1
+    return (first.index > second.index) - (first.index < second.index)
+
+
+def monotone_pieces(points) -> List[List[int]]:
+    """
+    Splits simple polygon (given counter-clockwise) into y-monotone pieces with the standard sweep
+    in time O(n log n). Returns list of pieces, each as a list of vertex indices in counter-clockwise order.
+    Based on: Computational Geometry: Algorithms and Applications by de Berg et al., chapter 3.
+    """
+    coords = np.asarray(points, dtype='d').tolist()
+    n = len(coords)
+
+    # vertices are handled from top to bottom
+    order = sorted(range(n), key=lambda i: (-coords[i][1], coords[i][0]))
+
+    # status of sweep line with edges that have interior of polygon on their right, and their helpers
+    sweep = [0.0, 0.0]
+    status = AVLTree(_compare_edges, sweep)
+    edges = [_SweepEdge(i, coords[i], coords[(i + 1) % n]) for i in range(n)]
+    helper = {}
+    merge = np.zeros(n, dtype=bool)
+    diagonals = []
+
+    def left_of(v):
+        # edge directly on the left of vertex v
+        node = status.lower_bound(_SweepEdge(-1, coords[v], coords[v]))
+        return (status.predecessor(node) if node is not None else status.last()).key
+
+    def add(edge):
+        edge.node = status.insert(edge)
+
+    def remove(edge):
+        status.remove(edge.node)
+        edge.node = None
+
+    def connect_merge_helper(edge, v):
+        if merge[helper[edge.index]]:
+            diagonals.append((v, helper[edge.index]))
+
+    for v in order:
+        prev, next = (v - 1) % n, (v + 1) % n
+        sweep[0], sweep[1] = coords[v]
+        prev_below = _above(coords, v, prev)
+        next_below = _above(coords, v, next)
+        convex = orient_robust(coords[prev], coords[v], coords[next]) > 0
+
+        # start vertex
+        if prev_below and next_below and convex:
+            add(edges[v])
+            helper[v] = v
+
+        # split vertex
+        elif prev_below and next_below:
+            edge = left_of(v)
+            diagonals.append((v, helper[edge.index]))
+            helper[edge.index] = v
+            add(edges[v])
+            helper[v] = v
+
+        # end vertex
+        elif not prev_below and not next_below and convex:
+            connect_merge_helper(edges[prev], v)
+            remove(edges[prev])
+
+        # merge vertex
+        elif not prev_below and not next_below:
+            merge[v] = True
+            connect_merge_helper(edges[prev], v)
+            remove(edges[prev])
+            edge = left_of(v)
+            connect_merge_helper(edge, v)
+            helper[edge.index] = v
+
+        # regular vertex with interior of polygon on the right
+        elif not prev_below:
+            connect_merge_helper(edges[prev], v)
+            remove(edges[prev])
+            add(edges[v])
+            helper[v] = v
+
+        # regular vertex with interior of polygon on the left
         else:
-            prev = right[ir-2] if ir > 1 else left[0]
+            edge = left_of(v)
+            connect_merge_helper(edge, v)
+            helper[edge.index] = v
 
-        # for each visible point
-        for v in visible:
+    return _split_by_diagonals(coords, diagonals)
 
-            if v != prev:
-                if side == 'left' and orient(e, prev, v) > 0:
-                    continue
-                if side == 'right' and orient(e, prev, v) < 0:
-                    continue
 
-            result.append((v, e))
+def _split_by_diagonals(coords, diagonals) -> List[List[int]]:
+    """ Splits polygon along given (non crossing) diagonals, returns faces as lists of vertex indices. """
+    n = len(coords)
 
-            # if its a line from left to right it blocks
-            if (v in left and e in right) or (v in right and e in left):
-                blocking.append(v)
+    # neighbours of vertices with diagonals, sorted counter-clockwise around them
+    neighbours = defaultdict(lambda: [])
+    for a, b in diagonals:
+        neighbours[a].append(b)
+        neighbours[b].append(a)
+    for v, extra in neighbours.items():
+        around = [(v - 1) % n, (v + 1) % n] + extra
+        around.sort(key=lambda u: math.atan2(coords[u][1] - coords[v][1], coords[u][0] - coords[v][0]))
+        neighbours[v] = around
 
-        # update visible vertices
-        if blocking:
-            visible = [min(blocking, key=lambda x: x[1])]
-        visible.append(e)
+    # walk every face keeping it on the left, by turning as much as possible to the left at every vertex
+    def following(u, v):
+        if v not in neighbours:
+            return (v + 1) % n
+        around = neighbours[v]
+        return around[around.index(u) - 1]
 
-    # add end vertex
-    for v in visible:
-        result.append((v, left[-1]))
+    starts = [(i, (i + 1) % n) for i in range(n)] + diagonals + [(b, a) for a, b in diagonals]
+    visited = set()
+    pieces = []
+    for start in starts:
+        if start in visited:
+            continue
+        piece = []
+        u, v = start
+        while (u, v) not in visited:
+            visited.add((u, v))
+            piece.append(u)
+            u, v = v, following(u, v)
+        pieces.append(piece)
 
-    return result
+    return pieces
+
+
+def polygon_triangles(points) -> np.ndarray:
+    """
+    Triangulates simple polygon in time O(n log n), by splitting it into y-monotone pieces and triangulating
+    each of them with monotone_triangles. Returns array of shape (n-2, 3) with indices of vertices of every
+    triangle (in counter-clockwise order). Polygon can be given in any orientation.
+    """
+    points = np.asarray(points, dtype='d')
+    n = len(points)
+    if n < 3:
+        return np.empty((0, 3), dtype=np.int32)
+
+    # work on counter-clockwise polygon
+    index = np.arange(n)
+    if np.sum(points[:, 0] * np.roll(points[:, 1], -1) - np.roll(points[:, 0], -1) * points[:, 1]) < 0:
+        index = index[::-1]
+
+    triangles = []
+    for piece in monotone_pieces(points[index]):
+        piece = index[piece]
+        triangles.append(piece[monotone_triangles(points[piece])])
+
+    return np.concatenate(triangles).astype(np.int32)
+
+
+class HalfEdgeMesh:
+    """
+    Half-edge structure of triangle mesh kept in NumPy arrays, without any per-element objects.
+    Half-edges of triangle t are 3t, 3t+1, 3t+2 (in counter-clockwise order), half-edge 3t+j goes from vertex
+    triangles[t, j] to triangles[t, (j+1) % 3], so next, previous half-edge and triangle follow from index.
+    Twin of half-edge on boundary of mesh is -1.
+    """
+
+    def __init__(self, points, triangles: np.ndarray):
+        """
+        :param points: vertices of mesh
+        :param triangles: array of shape (m, 3) with indices of vertices of every triangle (counter-clockwise)
+        """
+        self.points = np.asarray(points, dtype='d').reshape(-1, 2)
+        self.triangles = np.asarray(triangles, dtype=np.int32).reshape(-1, 3)
+        n, count = len(self.points), 3 * len(self.triangles)
+        self.origin = self.triangles.ravel()
+        target = self.triangles[:, [1, 2, 0]].ravel()
+
+        # twin of half-edge (u, v) is half-edge (v, u), found among half-edges sorted by (origin, target)
+        keys = self.origin.astype(np.int64) * n + target
+        reverse = target.astype(np.int64) * n + self.origin
+        order = np.argsort(keys)
+        twin = order[np.minimum(np.searchsorted(keys[order], reverse), max(count - 1, 0))] if count else order
+        self.twin = np.where(keys[twin] == reverse, twin, -1).astype(np.int32)
+
+        # outgoing half-edge of every vertex (-1 for unused ones), on boundary if vertex has one there
+        self.outgoing = np.full(n, -1, dtype=np.int32)
+        self.outgoing[self.origin] = np.arange(count, dtype=np.int32)
+        boundary = np.flatnonzero(self.twin < 0).astype(np.int32)
+        self.outgoing[self.origin[boundary]] = boundary
+
+    def __len__(self) -> int:
+        return len(self.triangles)
+
+    @staticmethod
+    def next(edge):
+        """ Next half-edge of the same triangle (works on arrays of half-edges as well). """
+        return edge - edge % 3 + (edge + 1) % 3
+
+    @staticmethod
+    def prev(edge):
+        """ Previous half-edge of the same triangle (works on arrays of half-edges as well). """
+        return edge - edge % 3 + (edge + 2) % 3
+
+    @property
+    def neighbours(self) -> np.ndarray:
+        """ Array of shape (m, 3) with triangle across every edge of every triangle (-1 on boundary). """
+        return np.where(self.twin >= 0, self.twin // 3, -1).reshape(-1, 3).astype(np.int32)
+
+    @property
+    def boundary(self) -> np.ndarray:
+        """ Half-edges on boundary of mesh. """
+        return np.flatnonzero(self.twin < 0)
+
+    def edges(self) -> np.ndarray:
+        """ Returns array of shape (k, 2) with every edge of mesh once (as pair of vertex indices). """
+        edges = np.flatnonzero((self.twin < 0) | (np.arange(len(self.twin)) < self.twin))
+        return np.stack((self.origin[edges], self.origin[self.next(edges)]), axis=1)
+
+    def around(self, vertex: int) -> List[int]:
+        """ Returns triangles around given vertex in counter-clockwise order. """
+        start = edge = int(self.outgoing[vertex])
+        result = []
+        while edge >= 0:
+            result.append(edge // 3)
+            edge = int(self.twin[self.prev(edge)])
+            if edge == start:
+                break
+        return result
+
+
+def triangulate(poly):
+    """ Triangulates any simple polygon, returns list of triangles (as triples of points). """
+    return [(poly[a], poly[b], poly[c]) for a, b, c in polygon_triangles(poly).tolist()]
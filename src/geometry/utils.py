@@ -1,16 +1,145 @@
-from typing import Tuple, Optional
+from fractions import Fraction
+from typing import Tuple, Optional, Callable
 
 import numpy as np
 
+from src import instrumentation
+
 Point = Tuple[float, float]
 
+# parameter bounds (lower, upper) for every line restriction, None means there is no bound
+RESTRICTIONS = {
+    'line': (None, None),
+    'segment': (0, 1),
+    'ray': (0, None),
+    'ray-inv': (None, 1),
+}
+
+# relative error bound of orient computed in floating point with translated formula, see orient_robust
+ORIENT_ERROR_BOUND = (3 + 16 * 2.0 ** -53) * 2.0 ** -53
+
 
 def orient(a: np.ndarray, b: np.ndarray, c: np.ndarray) -> float:
     return a[0]*b[1] + b[0]*c[1] + c[0]*a[1] - a[0]*c[1] - b[0]*a[1] - c[0]*b[1]
 
 
+def orient_batch(a: np.ndarray, b: np.ndarray, c: np.ndarray) -> np.ndarray:
+    """
+    Vectorized version of orient. Arguments are broadcast against each other, so any of them can be
+    either a single point of shape (2,) or an array of points of shape (N, 2).
+    Uses the same formula as orient, so results are bitwise equal to calling orient row by row.
+    """
+    a, b, c = np.asarray(a, dtype='d'), np.asarray(b, dtype='d'), np.asarray(c, dtype='d')
+    ax, ay = a[..., 0], a[..., 1]
+    bx, by = b[..., 0], b[..., 1]
+    cx, cy = c[..., 0], c[..., 1]
+    return ax*by + bx*cy + cx*ay - ax*cy - bx*ay - cx*by
+
+
+def orient_translated(a: np.ndarray, b: np.ndarray, c: np.ndarray) -> float:
+    """
+    Orient computed after translating points so that c is at the origin (the same formula as floating point
+    part of orient_robust). Its error is relative to distances between points, not to their magnitude, so it
+    can be compared with a fixed tolerance even far from the origin (and it is exactly 0 if c equals a or b).
+    """
+    ax, ay, bx, by, cx, cy = float(a[0]), float(a[1]), float(b[0]), float(b[1]), float(c[0]), float(c[1])
+    return (ax - cx) * (by - cy) - (ay - cy) * (bx - cx)
+
+
+def orient_translated_batch(a: np.ndarray, b: np.ndarray, c: np.ndarray) -> np.ndarray:
+    """ Vectorized version of orient_translated, arguments are broadcast like in orient_batch. """
+    a, b, c = np.asarray(a, dtype='d'), np.asarray(b, dtype='d'), np.asarray(c, dtype='d')
+    return (a[..., 0] - c[..., 0]) * (b[..., 1] - c[..., 1]) - (a[..., 1] - c[..., 1]) * (b[..., 0] - c[..., 0])
+
+
+def orient_many(a: np.ndarray, b: np.ndarray, points: np.ndarray) -> np.ndarray:
+    """ Returns orient of every point in array of shape (N, 2) relative to line going through a and b. """
+    return orient_translated_batch(a, b, points)
+
+
+def classify_orient(values: np.ndarray, epsilon: float = 1e-10) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Splits orient values into three boolean masks: left (value > epsilon), on line (|value| <= epsilon)
+    and right (value < -epsilon).
+    """
+    values = np.asarray(values)
+    left = values > epsilon
+    right = values < -epsilon
+    return left, ~(left | right), right
+
+
+def orient_masks(a: np.ndarray, b: np.ndarray, points: np.ndarray,
+                 epsilon: float = 1e-10) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """ Returns left, on line and right masks of points relative to line going through a and b. """
+    return classify_orient(orient_many(a, b, points), epsilon)
+
+
+def orient_exact(a: np.ndarray, b: np.ndarray, c: np.ndarray) -> Fraction:
+    """ Exact value of orient computed with rational numbers (every float is exactly representable as one). """
+    ax, ay, bx, by, cx, cy = map(Fraction, (a[0], a[1], b[0], b[1], c[0], c[1]))
+    return (ax - cx) * (by - cy) - (ay - cy) * (bx - cx)
+
+
+def _exact_float(value: Fraction) -> float:
+    """ Converts exact orient value to float, keeping its sign even if it is too small to be represented. """
+    result = float(value)
+    if result == 0 and value != 0:
+        return 5e-324 if value > 0 else -5e-324
+    return result
+
+
+def orient_robust(a: np.ndarray, b: np.ndarray, c: np.ndarray) -> float:
+    """
+    Orient with always correct sign (so that result can be compared with zero without any epsilon).
+    Floating point value is used if it is larger than its error bound, otherwise (for points that are
+    co-linear or almost co-linear) it is recomputed exactly with orient_exact.
+    Based on: Adaptive Precision Floating-Point Arithmetic and Fast Robust Geometric Predicates
+    by Jonathan Richard Shewchuk (static filter of orient2d).
+    """
+    ax, ay, bx, by, cx, cy = float(a[0]), float(a[1]), float(b[0]), float(b[1]), float(c[0]), float(c[1])
+    left = (ax - cx) * (by - cy)
+    right = (ay - cy) * (bx - cx)
+    det = left - right
+    if abs(det) > ORIENT_ERROR_BOUND * (abs(left) + abs(right)) or (left == 0 and right == 0):
+        return det
+    return _exact_float(orient_exact((ax, ay), (bx, by), (cx, cy)))
+
+
+def orient_robust_batch(a: np.ndarray, b: np.ndarray, c: np.ndarray) -> np.ndarray:
+    """
+    Vectorized version of orient_robust, arguments are broadcast like in orient_batch.
+    Error bound is checked for all rows at once and only rows that can not be decided by it
+    are recomputed exactly.
+    """
+    a, b, c = np.asarray(a, dtype='d'), np.asarray(b, dtype='d'), np.asarray(c, dtype='d')
+    left = (a[..., 0] - c[..., 0]) * (b[..., 1] - c[..., 1])
+    right = (a[..., 1] - c[..., 1]) * (b[..., 0] - c[..., 0])
+    det = np.asarray(left - right)
+
+    # products that are both exactly zero give exact result
+    ambiguous = (np.abs(det) <= ORIENT_ERROR_BOUND * (np.abs(left) + np.abs(right))) & ((left != 0) | (right != 0))
+    # boolean mask (unlike indices of rows) selects also from 0-d result of three single points
+    if ambiguous.any():
+        shape = det.shape + (2, )
+        a, b, c = (np.broadcast_to(p, shape)[ambiguous] for p in (a, b, c))
+        det[ambiguous] = [_exact_float(orient_exact(*points)) for points in zip(a.tolist(), b.tolist(), c.tolist())]
+    return det
+
+
+def orient_predicates(epsilon: Optional[float]) -> Tuple[Callable, Callable, float]:
+    """
+    Returns orient function, its vectorized version and tolerance to compare their results with.
+    For epsilon set to None (exact mode) robust versions are returned with zero tolerance, otherwise
+    translated ones, so that the tolerance does not have to depend on magnitude of coordinates.
+    """
+    if epsilon is None:
+        return orient_robust, orient_robust_batch, 0.0
+    return orient_translated, orient_translated_batch, epsilon
+
+
 def dist2(a: np.ndarray, b: np.ndarray) -> float:
-    return sum(np.square(b - a))
+    """ Squared distance between points, works on single points as well as on arrays of points. """
+    return np.sum(np.square(np.subtract(b, a)), axis=-1)
 
 
 def parametric_intersection(p1: Point, p2: Point, p3: Point, p4: Point) -> Optional[Tuple[float, float]]:
@@ -58,13 +187,15 @@ def intersection(p1: Point, p2: Point, p3: Point, p4: Point,
     t1, t2 = parameters
 
     # apply checks
-    if restriction_1 in ['segment', 'ray'] and t1 < 0:
+    lower_1, upper_1 = RESTRICTIONS[restriction_1]
+    lower_2, upper_2 = RESTRICTIONS[restriction_2]
+    if lower_1 is not None and t1 < lower_1:
         return None
-    if restriction_2 in ['segment', 'ray'] and t2 < 0:
+    if lower_2 is not None and t2 < lower_2:
         return None
-    if restriction_1 in ['segment', 'ray-inv'] and t1 > 1:
+    if upper_1 is not None and t1 > upper_1:
         return None
-    if restriction_2 in ['segment', 'ray-inv'] and t2 > 1:
+    if upper_2 is not None and t2 > upper_2:
         return None
 
     # return intersection point
@@ -72,3 +203,95 @@ def intersection(p1: Point, p2: Point, p3: Point, p4: Point,
         p1[0] + t1 * (p2[0] - p1[0]),
         p1[1] + t1 * (p2[1] - p1[1])
     )
+
+
+def parametric_intersection_batch(first: np.ndarray, second: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Vectorized version of parametric_intersection for arrays of lines of shape (M, 2, 2).
+    Returns parameters t1 and t2 (NaN or inf for parallel lines) and mask of parallel lines.
+    """
+    first, second = np.asarray(first, dtype='d'), np.asarray(second, dtype='d')
+    p1, p2, p3, p4 = first[..., 0, :], first[..., 1, :], second[..., 0, :], second[..., 1, :]
+
+    # calculate values (same formulas as in parametric_intersection)
+    numerator1 = (p3[..., 1] - p4[..., 1]) * (p1[..., 0] - p3[..., 0]) + (p4[..., 0] - p3[..., 0]) * (p1[..., 1] - p3[..., 1])
+    numerator2 = (p1[..., 1] - p2[..., 1]) * (p1[..., 0] - p3[..., 0]) + (p2[..., 0] - p1[..., 0]) * (p1[..., 1] - p3[..., 1])
+    denominator = (p4[..., 0] - p3[..., 0]) * (p1[..., 1] - p2[..., 1]) - (p1[..., 0] - p2[..., 0]) * (p4[..., 1] - p3[..., 1])
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return numerator1 / denominator, numerator2 / denominator, denominator == 0
+
+
+def _within(t: np.ndarray, restriction: str) -> np.ndarray:
+    """ Mask of parameters that satisfy given line restriction. """
+    lower, upper = RESTRICTIONS[restriction]
+    result = np.ones(np.shape(t), dtype=bool)
+    if lower is not None:
+        result &= t >= lower
+    if upper is not None:
+        result &= t <= upper
+    return result
+
+
+def _overlapping(first: np.ndarray, second: np.ndarray, restriction_1: str, restriction_2: str) -> np.ndarray:
+    """ For co-linear lines checks if their restricted parts share at least one point. """
+    p1, p2, p3, p4 = first[..., 0, :], first[..., 1, :], second[..., 0, :], second[..., 1, :]
+
+    # parameters of second line points on first line
+    direction = p2 - p1
+    length = np.sum(direction * direction, axis=-1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        s3 = np.sum((p3 - p1) * direction, axis=-1) / length
+        s4 = np.sum((p4 - p1) * direction, axis=-1) / length
+
+    # range of second line (in its own parameter) mapped to the first line
+    lower_1, upper_1 = RESTRICTIONS[restriction_1]
+    lower_2, upper_2 = RESTRICTIONS[restriction_2]
+    with np.errstate(invalid='ignore'):
+        a = s3 + (-np.inf if lower_2 is None else lower_2) * (s4 - s3)
+        b = s3 + (np.inf if upper_2 is None else upper_2) * (s4 - s3)
+    lo, hi = np.minimum(a, b), np.maximum(a, b)
+
+    # comparisons with NaN (degenerate lines) are false
+    return (lo <= (np.inf if upper_1 is None else upper_1)) & (hi >= (-np.inf if lower_1 is None else lower_1))
+
+
+def intersection_batch(first: np.ndarray, second: np.ndarray,
+                       restriction_1: str = 'line', restriction_2: str = 'line'
+                       ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Vectorized version of intersection, tests many pairs of (possibly restricted) lines at once.
+    Intersection points are computed with the same arithmetic as in intersection, so they are exactly the same.
+
+    :param first: array of shape (M, 2, 2) with points defining first lines
+    :param second: array of shape (M, 2, 2) with points defining second lines
+    :param restriction_1: restriction for first lines (as in intersection)
+    :param restriction_2: restriction for second lines (as in intersection)
+    :return: intersection points (NaN where there is no single intersection point), mask of pairs that intersect
+             in single point, mask of parallel pairs and mask of co-linear pairs that overlap
+    """
+    first, second = np.asarray(first, dtype='d'), np.asarray(second, dtype='d')
+    t1, t2, parallel = parametric_intersection_batch(first, second)
+
+    # apply checks
+    with np.errstate(invalid='ignore'):
+        valid = ~parallel & _within(t1, restriction_1) & _within(t2, restriction_2)
+
+    # parallel lines overlap if they are co-linear (so that both parameters are 0 / 0, one of them is 0 / 0
+    # also when the other line is degenerated to a point) and their restricted parts meet
+    overlap = parallel & np.isnan(t1) & np.isnan(t2) & _overlapping(first, second, restriction_1, restriction_2)
+
+    # intersection points
+    p1, p2 = first[..., 0, :], first[..., 1, :]
+    points = np.full(first.shape[:-2] + (2, ), np.nan)
+    t = t1[valid]
+    points[valid, 0] = p1[valid, 0] + t * (p2[valid, 0] - p1[valid, 0])
+    points[valid, 1] = p1[valid, 1] + t * (p2[valid, 1] - p1[valid, 1])
+
+    return points, valid, parallel, overlap
+
+
+# calls of orient predicates (also through orient_predicates and orient_many, and in modules importing them)
+# are counted by instrumentation
+instrumentation.count_calls(__name__, ('orient', 'orient_batch', 'orient_translated', 'orient_translated_batch',
+                                       'orient_robust', 'orient_robust_batch'), 'orient calls')
@@ -0,0 +1,133 @@
+"""
+Opt-in instrumentation of geometry algorithms: counters (orient calls, intersection tests, events, stack
+operations, ...) and timers of phases (sort, filter, scan, sweep, ...), collected while inside instrument():
+
+    with instrument() as stats:
+        graham(points)
+    print(stats.to_json())
+
+Instrumentation costs (almost) nothing when it is off:
+    - counted functions (like orient predicates) are registered with count_calls and replaced by counting
+      wrappers only inside instrument(), in every loaded module referring to them as a global (also when
+      imported with from ... import), so outside of it the original functions are called
+    - counts of operations inlined in loops are derived after the loop (or collected by a separate loop,
+      chosen once per call), only when instrumentation is on
+    - phases are timed only when instrumentation is on, otherwise phase returns a shared empty context
+Instrumentation is on for the whole process (not for workers of parallel algorithms), so calls made by
+other threads while it is on are counted too, and it can be turned on by one thread at a time.
+Functions kept elsewhere than in globals of a module (in local variables, closures, default arguments)
+before instrumentation is turned on are not counted.
+"""
+import functools
+import json
+import sys
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Dict, Iterator, Optional, Any, Callable, List, Tuple
+
+import numpy as np
+
+_NULL_CONTEXT = nullcontext()
+
+# statistics collected at the moment
+_active: Optional['Stats'] = None
+
+# functions which calls are counted while instrumentation is on: (module, name, counter)
+_counted: List[Tuple[str, str, str]] = []
+
+
+class Stats:
+    """ Counters and timers (total time in seconds of every phase) collected by instrumentation. """
+
+    def __init__(self):
+        self.counters: Dict[str, int] = {}
+        self.timers: Dict[str, float] = {}
+
+    def count(self, name: str, value: int = 1):
+        self.counters[name] = self.counters.get(name, 0) + int(value)
+
+    def maximum(self, name: str, value: int):
+        self.counters[name] = max(self.counters.get(name, 0), int(value))
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """ Adds time spent inside the context to timer of given phase. """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timers[name] = self.timers.get(name, 0.0) + time.perf_counter() - start
+
+    def as_dict(self) -> Dict[str, Dict[str, Any]]:
+        return {'counters': dict(self.counters), 'timers': dict(self.timers)}
+
+    def to_json(self, **kwargs) -> str:
+        return json.dumps(self.as_dict(), sort_keys=True, **kwargs)
+
+
+def active() -> Optional[Stats]:
+    """ Returns statistics collected at the moment (None if instrumentation is off). """
+    return _active
+
+
+def count_calls(module: str, names: Tuple[str, ...], counter: str):
+    """
+    Registers functions (global in given module) which calls are counted under given counter while
+    instrumentation is on. Functions returning arrays count one call for every element of their result.
+    """
+    _counted.extend((module, name, counter) for name in names)
+
+
+def _counting(function: Callable, counter: str) -> Callable:
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        result = function(*args, **kwargs)
+        # wrapper kept by other thread can be called after instrumentation is turned off
+        stats = _active
+        if stats is not None:
+            stats.count(counter, result.size if isinstance(result, np.ndarray) else 1)
+        return result
+    return wrapper
+
+
+def _references(functions: Dict[int, Callable]) -> List[Tuple[Dict[str, Any], str, Callable]]:
+    """ Returns (globals, name, function) for every global of loaded modules referring to one of functions. """
+    found = []
+    for module in list(sys.modules.values()):
+        namespace = getattr(module, '__dict__', None)
+        if not isinstance(namespace, dict):
+            continue
+        for name, value in list(namespace.items()):
+            if id(value) in functions and functions[id(value)] is value:
+                found.append((namespace, name, value))
+    return found
+
+
+def phase(name: str):
+    """ Context timing given phase if instrumentation is on (and doing nothing otherwise). """
+    return _NULL_CONTEXT if _active is None else _active.phase(name)
+
+
+@contextmanager
+def instrument() -> Iterator[Stats]:
+    """ Turns instrumentation on inside the context, yields statistics collected in it. """
+    global _active
+    if _active is not None:
+        raise RuntimeError('Instrumentation is already on')
+
+    stats = _active = Stats()
+    swapped = []
+    try:
+        wrappers, functions = {}, {}
+        for module, name, counter in _counted:
+            function = getattr(sys.modules[module], name)
+            functions[id(function)] = function
+            wrappers[id(function)] = _counting(function, counter)
+        for namespace, name, function in _references(functions):
+            swapped.append((namespace, name, function))
+            namespace[name] = wrappers[id(function)]
+        yield stats
+    finally:
+        for namespace, name, function in reversed(swapped):
+            namespace[name] = function
+        _active = None
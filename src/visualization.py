@@ -1,20 +1,92 @@
-from typing import List, Any, Tuple
+from typing import List, Any, Tuple, Optional, Dict, Union
 
 import numpy as np
 import matplotlib as mpl
 import matplotlib.pyplot as plt
 from matplotlib.collections import LineCollection
-from matplotlib.colors import to_rgba
+from matplotlib.colors import LinearSegmentedColormap, LogNorm, is_color_like, to_rgba, to_rgba_array
 
 
 mpl.rcParams['animation.html'] = 'jshtml'
 
-
-def plot_points(points: np.ndarray, annotations: List[str] = [], keep_aspect: bool = True, **kwargs):
-
-    # points
-    if len(points):
-        plt.scatter(*zip(*points), **kwargs)
+# above this number of points they are drawn as density image instead of markers
+DENSITY_THRESHOLD = 10 ** 6
+
+# optional automatic level of detail ('auto'): at most one point per pixel of figure is drawn, segments are
+# longer, so at most one per this number of pixels
+PIXELS_PER_SEGMENT = 16
+
+
+def _as_array(items, shape: Tuple[int, ...]) -> np.ndarray:
+    """ Converts points (or segments) given as array, sequence or any iterable (like set) to array. """
+    if not isinstance(items, (np.ndarray, list, tuple)):
+        items = list(items)
+    return np.asarray(items, dtype='d').reshape((-1, ) + shape)
+
+
+def _pixels() -> int:
+    """ Returns number of pixels of the current figure. """
+    width, height = plt.gcf().get_size_inches() * plt.gcf().dpi
+    return int(width * height)
+
+
+def _downsample(n: int, max_items: Union[int, str, None], kwargs: Dict[str, Any], pixels_per_item: int = 1) -> slice:
+    """
+    Returns slice taking every k-th of n items, so that at most max_items are left (level of detail),
+    per item arguments (like colors or sizes) in kwargs are sliced in place the same way.
+    Max_items 'auto' allows one item per given number of pixels of the current figure, None keeps all items.
+    """
+    if max_items == 'auto':
+        max_items = _pixels() // pixels_per_item
+    if max_items is None or n <= max_items:
+        return slice(None)
+    step = slice(None, None, -(-n // max(max_items, 1)))
+    for name, value in kwargs.items():
+        if not isinstance(value, str) and np.ndim(value) >= 1 and len(value) == n:
+            kwargs[name] = np.asarray(value)[step]
+    return step
+
+
+def plot_density(points: np.ndarray, bins: int = 512, color: Any = None, label: Optional[str] = None, **kwargs):
+    """
+    Draws points as 2D histogram displayed with imshow, so the cost of drawing does not depend on number
+    of points. Empty bins are transparent, other are colored (in given color, with opacity growing with
+    logarithm of count), so several sets can be drawn one over another.
+    """
+    points = _as_array(points, (2, ))
+    if not len(points):
+        return
+    low, high = points.min(axis=0), points.max(axis=0)
+    high = np.where(high > low, high, low + 1)
+
+    # bins are computed directly (faster than np.histogram2d, which searches bin edges)
+    cells = np.minimum(((points - low) * (bins / (high - low))).astype(np.int64), bins - 1)
+    counts = np.bincount(cells[:, 1] * bins + cells[:, 0], minlength=bins * bins).reshape(bins, bins)
+
+    rgba = to_rgba(color if is_color_like(color) else 'C0')
+    if 'cmap' not in kwargs:
+        kwargs['cmap'] = LinearSegmentedColormap.from_list('density', [rgba[:3] + (0.25, ), rgba[:3] + (1.0, )])
+    plt.imshow(np.ma.masked_equal(counts, 0), origin='lower', extent=(low[0], high[0], low[1], high[1]),
+               norm=LogNorm(vmin=1, vmax=max(counts.max(), 1)), interpolation='nearest', aspect='auto', **kwargs)
+
+    # images are not shown in legend, empty scatter stands for them there
+    if label is not None:
+        plt.scatter([], [], color=[rgba], label=label)
+
+
+def plot_points(points: np.ndarray, annotations: List[str] = [], keep_aspect: bool = True,
+                max_points: Union[int, str, None] = None, density_threshold: Optional[int] = DENSITY_THRESHOLD,
+                bins: int = 512, **kwargs):
+
+    # points are passed to matplotlib as arrays, big sets are drawn as density image or downsampled
+    points = _as_array(points, (2, ))
+    if density_threshold is not None and len(points) > density_threshold:
+        color = kwargs.pop('color', kwargs.pop('c', None))
+        extra = {name: kwargs[name] for name in ('label', 'alpha', 'zorder', 'cmap') if name in kwargs}
+        plot_density(points, bins, color, **extra)
+    elif len(points):
+        shown = points[_downsample(len(points), max_points, kwargs)]
+        plt.scatter(shown[:, 0], shown[:, 1], **kwargs)
 
     # aspect ratio
     if keep_aspect:
@@ -25,34 +97,40 @@ def plot_points(points: np.ndarray, annotations: List[str] = [], keep_aspect: bo
         plt.annotate(text, p, (5, 5), textcoords='offset pixels')
 
 
-def plot_segments(segments: np.ndarray, colors: Any = None, zorder: int = 1, **kwargs):
+def plot_segments(segments: np.ndarray, colors: Any = None, zorder: int = 1,
+                  max_segments: Union[int, str, None] = None, **kwargs):
 
-    # handle colors conversion
-    if isinstance(colors, list):
-        colors = [to_rgba(c) for c in colors]
+    # segments are passed to collection as single array
+    segments = _as_array(segments, (2, 2))
+    if isinstance(colors, (list, np.ndarray)):
+        kwargs['colors'] = to_rgba_array(colors)
     elif colors is not None:
-        colors = [to_rgba(colors)] * len(segments)
-    
+        kwargs['colors'] = to_rgba(colors)
+    segments = segments[_downsample(len(segments), max_segments, kwargs, PIXELS_PER_SEGMENT)]
+
     # plot segments using collection for better performance
-    plt.gca().add_collection(LineCollection(segments, colors=colors, zorder=zorder, **kwargs))
+    plt.gca().add_collection(LineCollection(segments, zorder=zorder, **kwargs))
     plt.gca().autoscale(True)
 
 
 def plot_chain(points: np.ndarray, closed: bool = False, **kwargs):
 
-    # create segments
-    segments = [(points[i - 1], points[i]) for i in range(1, len(points))]
+    # chain is an outline, so none of its edges is ever dropped by level of detail
+    kwargs.pop('max_segments', None)
 
-    # close loop if requested
-    if closed:
-        segments.append((points[-1], points[0]))
+    # create segments from consecutive points
+    points = _as_array(points, (2, ))
+    if closed and len(points):
+        points = np.concatenate((points, points[:1]))
+    segments = np.stack((points[:-1], points[1:]), axis=1)
 
     plot_segments(segments, **kwargs)
 
 
 def plot_classification(poly, classes):
-    plot_points([poly[i] for i in classes['begin']], color='g')
-    plot_points([poly[i] for i in classes['end']], color='r')
-    plot_points([poly[i] for i in classes['correct']], color='black')
-    plot_points([poly[i] for i in classes['connect']], color='blue')
-    plot_points([poly[i] for i in classes['split']], color='turquoise')
+    poly = _as_array(poly, (2, ))
+    plot_points(poly[classes['begin']], color='g')
+    plot_points(poly[classes['end']], color='r')
+    plot_points(poly[classes['correct']], color='black')
+    plot_points(poly[classes['connect']], color='blue')
+    plot_points(poly[classes['split']], color='turquoise')
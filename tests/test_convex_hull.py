@@ -0,0 +1,19 @@
+import numpy as np
+import pytest
+
+import src.generation as gen
+from src.geometry import chan_indices, graham_indices
+
+CORNER1, CORNER2 = np.array([-1000.0, -1000.0]), np.array([1000.0, 1000.0])
+
+
+@pytest.mark.parametrize('n', [100, 20000, 200000])
+@pytest.mark.parametrize('dataset', ['plane', 'circle'])
+@pytest.mark.parametrize('epsilon', [1e-10, None])
+def test_chan_returns_the_same_hull_as_graham(dataset, n, epsilon):
+    # every point of circle is a vertex of the hull, so the guess of hull size fails there
+    if dataset == 'plane':
+        points = gen.random_points_plane(n, CORNER1, CORNER2, rng=n)
+    else:
+        points = gen.random_points_circle(n, 1000.0, np.zeros(2), rng=n)
+    assert np.array_equal(chan_indices(points, epsilon), graham_indices(points, epsilon))
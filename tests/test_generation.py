@@ -0,0 +1,19 @@
+import numpy as np
+import pytest
+
+from src.generation import iter_chunks, random_points_plane, random_points_weird, random_segments_plane
+
+CORNER1, CORNER2 = np.array([-1.0, -1.0]), np.array([1.0, 1.0])
+
+
+@pytest.mark.parametrize('generator', [random_points_plane, random_segments_plane])
+def test_chunks_form_the_same_dataset_as_single_call(generator):
+    chunks = list(iter_chunks(generator, 1000, CORNER1, CORNER2, rng=7, chunk_size=300))
+    assert [len(chunk) for chunk in chunks] == [300, 300, 300, 100]
+    assert np.array_equal(np.concatenate(chunks), generator(1000, CORNER1, CORNER2, rng=7, chunk_size=300))
+
+
+def test_generator_of_several_counts_is_rejected():
+    corners = CORNER1, np.array([1.0, -1.0]), CORNER2, np.array([-1.0, 1.0])
+    with pytest.raises(ValueError, match='random_points_weird'):
+        iter_chunks(random_points_weird, 100, 100, *corners, rng=7, chunk_size=64)
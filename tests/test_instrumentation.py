@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+
+from src import instrumentation
+from src.geometry import utils
+from src.geometry.utils import orient, orient_batch
+from src.geometry.segments_intersections import bentley_ottmann
+
+
+def test_counted_functions_are_original_when_off():
+    original = orient
+    with instrumentation.instrument():
+        assert orient is not original and utils.orient is not original
+    assert orient is original and utils.orient is original
+    assert not hasattr(orient, '__wrapped__')
+
+
+def test_counts_calls_also_through_from_import():
+    with instrumentation.instrument() as stats:
+        orient((0, 0), (1, 0), (0, 1))
+        utils.orient((0, 0), (1, 0), (0, 1))
+        orient_batch(np.zeros((7, 2)), (1, 0), (0, 1))
+    assert stats.counters == {'orient calls': 9}
+
+
+def test_counts_intersection_tests_once_per_call():
+    segments = [((0, 0), (2, 2)), ((0, 2), (2, 0))]
+    with instrumentation.instrument() as stats:
+        assert bentley_ottmann(segments, output='count') == 1
+    # pair is tested when the second segment is inserted and again after they swap (not per coordinate of point)
+    assert stats.counters['intersection tests'] == 2
+
+
+def test_can_not_be_nested():
+    with instrumentation.instrument():
+        with pytest.raises(RuntimeError):
+            with instrumentation.instrument():
+                pass
+    assert instrumentation.active() is None
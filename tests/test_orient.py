@@ -0,0 +1,49 @@
+from fractions import Fraction
+
+import numpy as np
+import pytest
+
+from src.geometry.utils import orient_batch, orient_robust, orient_robust_batch
+
+
+def exact_sign(a, b, c) -> int:
+    (ax, ay), (bx, by), (cx, cy) = ([Fraction(v) for v in p] for p in (a, b, c))
+    det = (ax - cx) * (by - cy) - (ay - cy) * (bx - cx)
+    return (det > 0) - (det < 0)
+
+
+@pytest.mark.parametrize('a, b, c', [
+    ((0.0, 0.0), (1.0, 1.0), (2.0, 2.0)),
+    ((0.1, 0.1), (0.3, 0.3), (0.7, 0.7)),  # decided only by exact fallback
+    ((0.5, 0.5), (12.0, 12.0), (24.0, 24.0 + 2 ** -48)),
+    ((0.0, 0.0), (1.0, 0.0), (0.0, 1.0)),
+])
+def test_single_points(a, b, c):
+    result = orient_robust_batch(np.array(a), np.array(b), np.array(c))
+    assert np.shape(result) == np.shape(orient_batch(np.array(a), np.array(b), np.array(c))) == ()
+    assert np.sign(result) == exact_sign(a, b, c)
+    assert float(result) == orient_robust(a, b, c)
+
+
+def test_broadcast_single_point_against_arrays():
+    rng = np.random.default_rng(0)
+    x = rng.uniform(0, 1, 200)
+    points = np.stack((x, x), axis=1)  # co-linear with a and b, rounding makes the float sign unreliable
+    points[::2] += rng.normal(0, 1e-17, (100, 2))
+    a, b = np.array([0.1, 0.1]), np.array([0.7, 0.7])
+    result = orient_robust_batch(a, b, points)
+    assert result.shape == (200, )
+    assert [np.sign(r) for r in result] == [exact_sign(a, b, p) for p in points]
+    assert np.array_equal(result, [orient_robust(a, b, p) for p in points])
+
+
+def test_broadcast_grids():
+    rng = np.random.default_rng(1)
+    a = np.round(rng.uniform(0, 4, (5, 1, 2))) / 3
+    b = np.round(rng.uniform(0, 4, (1, 7, 2))) / 3
+    c = np.round(rng.uniform(0, 4, (7, 2))) / 3
+    result = orient_robust_batch(a, b, c)
+    assert result.shape == orient_batch(a, b, c).shape == (5, 7)
+    for i in range(5):
+        for j in range(7):
+            assert np.sign(result[i, j]) == exact_sign(a[i, 0], b[0, j], c[j])
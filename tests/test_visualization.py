@@ -0,0 +1,45 @@
+import matplotlib
+matplotlib.use('Agg')
+
+import matplotlib.pyplot as plt
+import numpy as np
+import pytest
+
+from src.visualization import plot_chain, plot_points, plot_segments
+
+
+@pytest.fixture(autouse=True)
+def figure():
+    plt.figure(figsize=(4, 3), dpi=100)
+    yield
+    plt.close('all')
+
+
+def polygon(n: int) -> np.ndarray:
+    angles = np.linspace(0, 2 * np.pi, n, endpoint=False)
+    return np.stack((np.cos(angles), np.sin(angles)), axis=1) * 1000
+
+
+def test_chain_of_large_polygon_draws_every_edge():
+    points = polygon(30000)
+    plot_chain(points, closed=True, max_segments='auto')
+    segments = plt.gca().collections[0].get_segments()
+    assert len(segments) == len(points)
+    assert np.array_equal(np.array(segments)[:, 0], points)
+    assert np.array_equal(np.array(segments)[:, 1], np.roll(points, -1, axis=0))
+
+
+def test_segments_and_points_are_not_downsampled_by_default():
+    segments = np.random.rand(50000, 2, 2)
+    points = np.random.rand(500000, 2)
+    plot_segments(segments)
+    plot_points(points)
+    assert len(plt.gca().collections[0].get_segments()) == len(segments)
+    assert len(plt.gca().collections[1].get_offsets()) == len(points)
+
+
+def test_automatic_level_of_detail_is_opt_in():
+    plot_segments(np.random.rand(50000, 2, 2), max_segments='auto')
+    plot_points(np.random.rand(500000, 2), max_points='auto')
+    assert len(plt.gca().collections[0].get_segments()) <= 400 * 300 // 16
+    assert len(plt.gca().collections[1].get_offsets()) <= 400 * 300